@@ -0,0 +1,356 @@
+"""
+Offline benchmarks for the parse, clean, location and write paths.
+
+Runs against a synthetic 'hydra:member' corpus (or a recorded one), a local
+http.server stand-in for the Free-Work API and mongomock, or a real mongod with
+--mongo-uri. Results are written as JSON so runs can be compared across commits:
+
+    python bench.py --sizes 1000 10000 --output bench.json
+    python bench.py --corpus recorded_page.json
+    python bench.py --corpus .cache/pages
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import main
+from cache import ResponseCache
+from jsonlib import BACKEND, loads, decode_job_page
+from locations import FRENCH_DEPARTMENTS, canonical_token, normalize_text, parse_location, resolve_location
+from metrics import METRICS
+from parser import parse_job_postings
+from update import migrate_locations
+from utils import clean_html
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+ITEMS_PER_PAGE = 1000
+# mongomock matches every update filter with a linear scan, so write benchmarks grow
+# quadratically with the corpus; larger sizes need a real mongod (--mongo-uri).
+MONGOMOCK_MAX_SIZE = 1000
+
+LOCATION_LABELS = [
+    'Paris, Île-de-France', 'Lyon, Auvergne-Rhône-Alpes', 'Nantes, Loire-Atlantique',
+    'Essonne, France', 'Hauts-de-Seine', 'Toulouse, Haute-Garonne', 'Lille, Nord',
+    'Bordeaux, Gironde', 'Remote', 'Bruxelles, Belgique', 'Genève, Suisse',
+    'Luxembourg', 'Sophia Antipolis, Alpes-Maritimes', 'Rennes, Ille-et-Vilaine',
+    'Montréal, Canada', 'Marseille, Bouches-du-Rhône', 'France',
+]
+SKILLS = ['python', 'java', 'react', 'aws', 'kubernetes', 'sql', 'scrapy', 'terraform', 'go', 'docker']
+PARAGRAPHS = [
+    "<p>Nous recherchons un <b>développeur Python</b> pour une mission longue.</p>",
+    "<ul><li>Web scraping et collecte de données</li><li>APIs REST</li></ul>",
+    "<p>Environnement <i>cloud</i> AWS, CI/CD &amp; Kubernetes.</p>",
+    "<script>var tracking = 1;</script><p>Télétravail partiel possible.</p>",
+    "<p>Équipe de 8 personnes, méthodologie agile.</p><br/>",
+]
+
+
+def synthetic_members(count, seed=0):
+    """Build `count` 'hydra:member' items shaped like the Free-Work API output."""
+    rng = random.Random(seed)
+    members = []
+    for i in range(count):
+        job_id = 100000 + i
+        skills = rng.sample(SKILLS, rng.randint(0, 4))
+        members.append({
+            '@id': f'/job_postings/{job_id}',
+            'id': job_id,
+            'title': f'Développeur Python #{i}',
+            'location': {'label': rng.choice(LOCATION_LABELS)},
+            'company': {'name': f'Company {i % 500}'},
+            'job': {'nameForUserSlug': 'developpeur-python'},
+            'description': ''.join(rng.choices(PARAGRAPHS, k=rng.randint(2, 8))),
+            'candidateProfile': ''.join(rng.choices(PARAGRAPHS, k=rng.randint(1, 3))),
+            'skills': [
+                {'name': s.title(), 'slug': s, 'skillJobs': [{'description': f'{s} confirmé'}]}
+                for s in skills
+            ],
+            'experienceLevel': rng.choice(['junior', 'intermediate', 'senior', None]),
+            'durationValue': rng.choice([3, 6, 12, None]),
+            'durationPeriod': 'month',
+            'remoteMode': rng.choice(['full', 'partial', 'none']),
+            'minDailySalary': rng.choice([400, 500, None]),
+            'maxDailySalary': rng.choice([600, 700, None]),
+            'startsAt': '2026-11-01T00:00:00+01:00',
+            'expiredAt': '2026-12-01T00:00:00+01:00',
+            'publishedAt': '2026-10-17T09:00:00+02:00',
+            'contracts': [rng.choice(['contractor', 'permanent', 'fixed-term'])],
+        })
+    return members
+
+
+def distinct_location_labels(count, seed=0):
+    """
+    Build `count` distinct location labels shaped like the Free-Work ones, so
+    parse_location is measured on cache misses rather than on the few labels of a page.
+    """
+    rng = random.Random(seed)
+    places = [d.title() for d in sorted(FRENCH_DEPARTMENTS)] + ['Belgique', 'Suisse', 'Canada']
+    formats = ['{town}, {place}', '{town}, {place}, France', '{town}']
+    return [
+        rng.choice(formats).format(town=f'Saint-Bench-{i}', place=rng.choice(places))
+        for i in range(count)
+    ]
+
+
+def clear_location_caches():
+    """Empty the lru_caches of locations.py, including those parse_location calls into."""
+    for fn in (normalize_text, canonical_token, parse_location, resolve_location):
+        fn.cache_clear()
+
+
+def load_corpus(path):
+    """
+    Load recorded 'hydra:member' items from a JSON page, a JSON list of items, or a
+    directory written by ResponseCache (every cached page is included).
+    """
+    if os.path.isdir(path):
+        cache = ResponseCache(path)
+        members = []
+        for url in cache.urls():
+            body = cache.body(url)
+            if body:
+                members.extend(decode_job_page(body).get('hydra:member') or [])
+        return members
+    with open(path, 'rb') as f:
+        data = loads(f.read())
+    return data if isinstance(data, list) else data.get('hydra:member', [])
+
+
+def resize(members, count):
+    """Repeat or truncate `members` to `count` items, giving the copies ids of their own."""
+    if len(members) >= count:
+        return members[:count]
+    resized = []
+    for i in range(count):
+        item = dict(members[i % len(members)])
+        if i >= len(members):
+            item['id'] = 10 ** 9 + i
+        resized.append(item)
+    return resized
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the progress prints of the code under measurement."""
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            yield
+
+
+def measure(name, size, items, fn):
+    with quiet():
+        started = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - started
+    result = {
+        'benchmark': name,
+        'size': size,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'items_per_second': round(items / seconds, 1) if seconds else None,
+    }
+    print(f"{name:<20} size={size:<7} {seconds:9.3f}s {result['items_per_second']} items/s", file=sys.stderr)
+    return result
+
+
+class CorpusServer:
+    """Serve `members` as paginated job_postings pages on a local port, like the Free-Work API."""
+
+    def __init__(self, members):
+        self.members = members
+        handler = self._handler()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/api/job_postings"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def _handler(self):
+        members = self.members
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query.get('page', ['1'])[0])
+                per_page = int(query.get('itemsPerPage', ['30'])[0])
+                start = (page - 1) * per_page
+                data = {'hydra:member': members[start:start + per_page], 'hydra:totalItems': len(members)}
+                if start + per_page < len(members):
+                    data['hydra:view'] = {'hydra:next': f'/api/job_postings?page={page + 1}&itemsPerPage={per_page}'}
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/ld+json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def open_collection(mongo_uri, name):
+    """A fresh collection on a local mongod, or on mongomock when no URI is given."""
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+    elif mongomock is not None:
+        client = mongomock.MongoClient()
+    else:
+        raise SystemExit("mongomock is not installed: pip install mongomock, or pass --mongo-uri")
+    collection = client['freework_bench'][name]
+    collection.drop()
+    return client, collection
+
+
+def bench_size(members, size, mongo_uri, crawl_options, mongomock_max_size=MONGOMOCK_MAX_SIZE):
+    current_date = datetime.now().strftime('%Y-%m-%d')
+    results = []
+    page = {'hydra:member': members}
+
+    results.append(measure('parse_job_postings', size, len(members),
+                           lambda: parse_job_postings(page, current_date)))
+
+    fragments = [m.get('description') for m in members] + [m.get('candidateProfile') for m in members]
+    results.append(measure('clean_html', size, len(fragments),
+                           lambda: [clean_html(f) for f in fragments]))
+
+    labels = [(m.get('location') or {}).get('label') for m in members]
+    distinct_labels = distinct_location_labels(size)
+
+    def parse_labels():
+        clear_location_caches()
+        for label in distinct_labels:
+            parse_location(label)
+
+    results.append(measure('parse_location', size, len(distinct_labels), parse_labels))
+
+    if not mongo_uri and size > mongomock_max_size:
+        print(f"Skipping write benchmarks for size={size} on mongomock (use --mongo-uri).", file=sys.stderr)
+        return results
+
+    for name, batched in (('migrate_locations', False), ('migrate_batched', True)):
+        client, collection = open_collection(mongo_uri, f'migrate_{size}')
+        collection.insert_many([
+            {'id': m.get('id'), 'location': label, 'city': None, 'department': None}
+            for m, label in zip(members, labels)
+        ])
+        clear_location_caches()
+        results.append(measure(name, size, len(members), lambda: migrate_locations(
+            collection, dry_run=False, full_scan=True, batched=batched,
+        )))
+        collection.drop()
+        client.close()
+
+    results.append(bench_crawl(members, size, mongo_uri, crawl_options))
+    return results
+
+
+def bench_crawl(members, size, mongo_uri, crawl_options):
+    """Time main.main() crawling every page of `members` from the local server."""
+    client, collection = open_collection(mongo_uri, f'crawl_{size}')
+    # The returned client is closed by main(), so hand it over instead of the real init_db.
+    original_init_db, original_base_url = main.init_db, main.BASE_URL
+    with CorpusServer(members) as server:
+        main.init_db = lambda: (client, collection)
+        main.BASE_URL = server.base_url
+        try:
+            options = {
+                'all_pages': True,
+                'max_pages': len(members) // ITEMS_PER_PAGE + 1,
+                'rate_limit': 0,
+                **crawl_options,
+            }
+            METRICS.reset()
+            result = measure('crawl', size, len(members), lambda: asyncio.run(main.main(**options)))
+            result['stages'] = METRICS.summary()['timers']
+        finally:
+            main.init_db, main.BASE_URL = original_init_db, original_base_url
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark the Free-Work scraper offline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help="Corpus sizes to benchmark (default: 1000 10000 100000).")
+    parser.add_argument('--corpus',
+                        help="Recorded corpus: a job_postings JSON page, a JSON list of items, or a --cache-dir directory.")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="Seed of the synthetic corpus (default: 0).")
+    parser.add_argument('--mongo-uri',
+                        help="Benchmark writes against this mongod instead of mongomock.")
+    parser.add_argument('--mongomock-max-size', type=int, default=MONGOMOCK_MAX_SIZE,
+                        help=f"Largest size whose writes are benchmarked on mongomock (default: {MONGOMOCK_MAX_SIZE}).")
+    parser.add_argument('--concurrency', type=int, default=2,
+                        help="Concurrency of the end-to-end crawl (default: 2).")
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="Parse worker processes of the end-to-end crawl (default: 0).")
+    parser.add_argument('--output',
+                        help="Write the JSON results to this file instead of stdout.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_members(max(args.sizes), args.seed)
+    if not corpus:
+        raise SystemExit("The corpus is empty.")
+    crawl_options = {'concurrency': args.concurrency, 'parse_workers': args.parse_workers}
+
+    results = []
+    for size in args.sizes:
+        results.extend(bench_size(
+            resize(corpus, size), size, args.mongo_uri, crawl_options, args.mongomock_max_size,
+        ))
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'json_backend': BACKEND,
+        'corpus': args.corpus or f'synthetic(seed={args.seed})',
+        'mongo': 'mongod' if args.mongo_uri else 'mongomock',
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class NotModified:
+    """
+    A page the server reported unchanged (HTTP 304) since it was cached, with the ids
+    of the jobs it held when it was stored.
+    """
+
+    def __init__(self, url, last_page, ids=()):
+        self.url = url
+        self.last_page = last_page
+        self.ids = list(ids)
+
+    def __repr__(self):
+        return f"NotModified({self.url!r})"
+
+
+class ResponseCache:
+    """
+    On-disk cache of page responses keyed by URL.
+
+    Each entry is a raw body file plus a small JSON metadata file holding the
+    validators (ETag, Last-Modified) sent back on the next request as
+    If-None-Match / If-Modified-Since. With `replay=True` no request is sent at all
+    and pages are served from the cache only.
+
+    A fetched page is only staged in memory: it is written with `commit()` once its jobs
+    are stored, so a 304 can never stand for a page whose jobs were not saved.
+    """
+
+    def __init__(self, directory, replay=False):
+        self.directory = directory
+        self.replay = replay
+        self._staged = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, suffix):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + suffix)
+
+    def _write(self, path, data):
+        # Write to a temporary file first so a crash never leaves a truncated entry.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def metadata(self, url):
+        """The stored metadata for `url`, or None when it is not cached."""
+        try:
+            with open(self._path(url, '.json'), 'rb') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def body(self, url):
+        """The stored response body for `url`, or None when it is not cached."""
+        try:
+            with open(self._path(url, '.body'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for the cached copy of `url`."""
+        meta = self.metadata(url)
+        if meta is None or not os.path.exists(self._path(url, '.body')):
+            return {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def store(self, url, body, etag=None, last_modified=None, last_page=False, ids=()):
+        """Save a 200 response body, its validators and the ids of the jobs it holds."""
+        self._write(self._path(url, '.body'), body)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'last_page': last_page,
+            'ids': list(ids),
+            'stored_at': time.time(),
+        }
+        self._write(self._path(url, '.json'), json.dumps(meta).encode('utf-8'))
+
+    def stage(self, url, body, etag=None, last_modified=None, last_page=False):
+        """Keep a 200 response in memory until `commit(url)`; see store() for the arguments."""
+        with self._lock:
+            self._staged[url] = (body, etag, last_modified, last_page)
+
+    def commit(self, url, ids=()):
+        """Store the staged response of `url`, once its jobs (`ids`) are written."""
+        with self._lock:
+            staged = self._staged.pop(url, None)
+        if staged is not None:
+            body, etag, last_modified, last_page = staged
+            self.store(url, body, etag, last_modified, last_page, ids)
+
+    def not_modified(self, url):
+        """Build the NotModified marker for a 304 answer to a conditional request."""
+        meta = self.metadata(url) or {}
+        return NotModified(url, meta.get('last_page', False), meta.get('ids') or ())
+
+    def urls(self):
+        """URLs of every cached page."""
+        urls = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.json'):
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    urls.append(json.load(f)['url'])
+        return urls
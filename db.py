@@ -1,10 +1,18 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, UpdateOne, IndexModel, ASCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
+import asyncio
+import logging
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote
 from dotenv import load_dotenv
+from metrics import METRICS
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 def init_db():
     """Initialize MongoDB connection using environment variables."""
     user = os.getenv("MONGO_USER")
@@ -13,39 +21,260 @@ def init_db():
     db_name = os.getenv("MONGO_DB")
     collection_name = os.getenv("MONGO_COLLECTION")
 
-    print(f"Environment variables: user={user}, host={host}, db={db_name}, collection={collection_name}, password_set={bool(password)}", file=sys.stderr)
+    logger.debug("Environment variables: user=%s, host=%s, db=%s, collection=%s, password_set=%s",
+                 user, host, db_name, collection_name, bool(password))
     if not all([user, password, host, db_name, collection_name]):
-        print(f"Missing environment variables: user={user}, password_set={bool(password)}, host={host}, db={db_name}, collection={collection_name}", file=sys.stderr)
+        logger.error("Missing environment variables: user=%s, password_set=%s, host=%s, db=%s, collection=%s",
+                     user, bool(password), host, db_name, collection_name)
         sys.exit(1)
 
     try:
         encoded_password = quote(password)
     except Exception as e:
-        print(f"Password encoding failed: {e}", file=sys.stderr)
+        logger.error("Password encoding failed: %s", e)
         sys.exit(1)
 
     uri = f"mongodb+srv://{user}:{encoded_password}@{host}/{db_name}?retryWrites=true&w=majority"
-    print(f"Attempting MongoDB connection with URI: mongodb+srv://{user}:[REDACTED]@{host}/{db_name}", file=sys.stderr)
+    logger.info("Attempting MongoDB connection with URI: mongodb+srv://%s:[REDACTED]@%s/%s", user, host, db_name)
     try:
         client = MongoClient(uri)
         client.admin.command('ping')
-        print("MongoDB connection successful", file=sys.stderr)
+        logger.info("MongoDB connection successful")
         db = client[db_name]
         collection = db[collection_name]
         return client, collection
     except Exception as e:
-        print(f"MongoDB connection failed: {e}", file=sys.stderr)
+        logger.error("MongoDB connection failed: %s", e)
         sys.exit(1)
 
-def insert_job(collection, job):
-    """Insert or update a job document in the MongoDB collection."""
-    try:
-        collection.replace_one(
-            {'id': job['id']},
-            job,
-            upsert=True
+class WriteError(Exception):
+    """A batch of jobs could not be written to MongoDB."""
+
+
+# Built on its own: legacy duplicate ids make it fail without blocking the others.
+ID_INDEX = IndexModel([('id', ASCENDING)], unique=True, name='id_unique')
+
+INDEXES = [
+    IndexModel([('published_at', ASCENDING)], name='published_at'),
+    IndexModel([('date', ASCENDING)], name='date'),
+    IndexModel([('department', ASCENDING)], name='department'),
+    IndexModel([('scraping', ASCENDING)], name='scraping'),
+    IndexModel([('location_version', ASCENDING)], name='location_version'),
+    # Multikey: one index entry per tag, so {'tags': 'python'} is an index lookup.
+    IndexModel([('tags', ASCENDING)], name='tags'),
+]
+
+
+def ensure_indexes(collection):
+    """Create the indexes the scraper and the migration rely on. Existing indexes are left untouched."""
+    for indexes in ([ID_INDEX], INDEXES):
+        try:
+            names = collection.create_indexes(indexes)
+            logger.info("Indexes ensured: %s", ', '.join(names))
+        except OperationFailure as e:
+            # Typically duplicate ids from before the unique index existed; writes still work without it.
+            logger.warning("Could not create indexes: %s", e)
+
+
+def known_ids(collection, ids):
+    """Return the subset of `ids` that already exist in the collection."""
+    cursor = collection.find({'id': {'$in': list(ids)}}, {'_id': 0, 'id': 1})
+    return {doc['id'] for doc in cursor}
+
+
+class BulkWriter:
+    """
+    Buffer job records and upsert their documents with unordered bulk_write calls.
+    With no collection (a dry run) the buffered batches are discarded instead.
+    The buffer is flushed when it reaches `batch_size` documents or when the oldest
+    buffered document is older than `flush_interval` seconds.
+
+    With `skip_unchanged`, the stored fingerprints of a batch are fetched with a single
+    `$in` query: jobs whose fingerprint matches are skipped, or only get their `date`
+    refreshed, instead of being replaced in full.
+    """
+
+    def __init__(self, collection, batch_size=1000, flush_interval=5.0, skip_unchanged=True):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.skip_unchanged = skip_unchanged
+        self.totals = {'matched': 0, 'upserted': 0, 'modified': 0, 'touched': 0, 'unchanged': 0}
+        self._jobs = []
+        self._first_added_at = None
+
+    def add(self, job):
+        """Queue an upsert for a JobRecord, flushing if a size or time threshold is reached."""
+        if not self._jobs:
+            self._first_added_at = time.monotonic()
+        self._jobs.append(job.to_document())
+        if len(self._jobs) >= self.batch_size or time.monotonic() - self._first_added_at >= self.flush_interval:
+            return self.flush()
+        return None
+
+    def stored_fingerprints(self, ids):
+        """Return {id: (fingerprint, date)} for the given job ids already in the collection."""
+        cursor = self.collection.find(
+            {'id': {'$in': ids}},
+            {'_id': 0, 'id': 1, 'fingerprint': 1, 'date': 1},
         )
-        print(f"Inserted job with id: {job['id']}", file=sys.stderr)
-    except Exception as e:
-        print(f"Failed to insert job: {e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+        return {doc['id']: (doc.get('fingerprint'), doc.get('date')) for doc in cursor}
+
+    def build_ops(self, jobs):
+        """Turn a batch of jobs into write operations, returning (ops, touched, unchanged)."""
+        if not self.skip_unchanged:
+            return [ReplaceOne({'id': job['id']}, job, upsert=True) for job in jobs], 0, 0
+
+        stored = self.stored_fingerprints([job['id'] for job in jobs])
+        ops = []
+        touched = unchanged = 0
+        for job in jobs:
+            fingerprint, date = stored.get(job['id'], (None, None))
+            if fingerprint is None or fingerprint != job.get('fingerprint'):
+                ops.append(ReplaceOne({'id': job['id']}, job, upsert=True))
+            elif date != job.get('date'):
+                ops.append(UpdateOne({'id': job['id']}, {'$set': {'date': job.get('date')}}))
+                touched += 1
+            else:
+                unchanged += 1
+        return ops, touched, unchanged
+
+    def flush(self):
+        """
+        Send the buffered operations and return the batch counts, or None if nothing was buffered.
+        Raises WriteError when the batch cannot be written.
+        """
+        if not self._jobs:
+            return None
+        jobs, self._jobs = self._jobs, []
+        if self.collection is None:
+            # Dry run: the jobs went through parsing and serialization but are not written.
+            logger.info("Dry run: discarded batch of %d jobs", len(jobs))
+            return None
+        try:
+            with METRICS.timer('write'):
+                ops, touched, unchanged = self.build_ops(jobs)
+                result = self.collection.bulk_write(ops, ordered=False) if ops else None
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            raise WriteError(f"Bulk write failed for {len(errors)}/{len(jobs)} jobs: {errors[:1]}") from e
+        except Exception as e:
+            raise WriteError(f"Failed to write batch of {len(jobs)} jobs: {e}") from e
+
+        counts = {
+            'matched': result.matched_count if result else 0,
+            'upserted': result.upserted_count if result else 0,
+            'modified': result.modified_count if result else 0,
+            'touched': touched,
+            'unchanged': unchanged,
+        }
+        for key, value in counts.items():
+            self.totals[key] += value
+            METRICS.incr(f'write_{key}', value)
+        logger.info(
+            "Wrote batch of %d jobs: matched=%d, upserted=%d, modified=%d, touched=%d, unchanged=%d",
+            len(jobs), counts['matched'], counts['upserted'], counts['modified'],
+            counts['touched'], counts['unchanged'],
+        )
+        return counts
+
+    def touch(self, ids, date):
+        """
+        Refresh the `date` of stored jobs that were seen again without being parsed (a page
+        answered 304), like unchanged jobs get on a normal write. Returns the touched count.
+        """
+        if self.collection is None or not ids:
+            return 0
+        try:
+            with METRICS.timer('write'):
+                result = self.collection.update_many(
+                    {'id': {'$in': list(ids)}, 'date': {'$ne': date}}, {'$set': {'date': date}},
+                )
+        except Exception as e:
+            raise WriteError(f"Failed to refresh the date of {len(ids)} jobs: {e}") from e
+        self.totals['touched'] += result.modified_count
+        METRICS.incr('write_touched', result.modified_count)
+        logger.info("Refreshed the date of %d not modified jobs", result.modified_count)
+        return result.modified_count
+
+
+class AsyncJobWriter:
+    """
+    Run a BulkWriter on a dedicated thread behind a bounded asyncio.Queue.
+    `put()` returns as soon as a list of jobs is queued, and only waits when `max_pending`
+    lists are already waiting, so the event loop keeps fetching the next page while the
+    previous one is persisted. Queued jobs are written in order; with `flush=False` they
+    stay buffered in the BulkWriter until its size threshold or the next flushing put.
+    """
+
+    def __init__(self, writer, max_pending=2):
+        self.writer = writer
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mongo-writer')
+        self._task = None
+
+    @property
+    def totals(self):
+        return self.writer.totals
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                # Jobs queued with flush=False may still be buffered.
+                await loop.run_in_executor(self._executor, self.writer.flush)
+                return
+            await loop.run_in_executor(self._executor, *item)
+
+    def _write(self, jobs, flush, on_written):
+        for job in jobs:
+            self.writer.add(job)
+        if flush:
+            self.writer.flush()
+            if on_written is not None:
+                on_written()
+
+    async def _enqueue(self, item):
+        """
+        Put `item` on the queue, unless the writer stops first: a WriteError raised while
+        the queue is full would otherwise leave put() waiting on a queue nobody reads.
+        """
+        if not self._task.done():
+            queued = asyncio.ensure_future(self._queue.put(item))
+            await asyncio.wait({queued, self._task}, return_when=asyncio.FIRST_COMPLETED)
+            if queued.done():
+                return
+            queued.cancel()
+        # The writer stopped early: surface its exception instead of blocking forever.
+        await self._task
+        raise RuntimeError("Job writer is closed")
+
+    async def put(self, jobs, flush=True, on_written=None):
+        """
+        Queue jobs for writing, waiting while the queue is full. With `flush`, the optional
+        `on_written` callable runs on the writer thread once everything queued so far is written.
+        Raises the WriteError of an earlier batch if the writer has stopped on one.
+        """
+        await self._enqueue((self._write, list(jobs), flush, on_written))
+
+    async def touch(self, ids, date):
+        """Queue a `date` refresh of stored jobs (BulkWriter.touch), in order with the writes."""
+        await self._enqueue((self.writer.touch, list(ids), date))
+
+    async def close(self):
+        """
+        Write every queued and buffered job, stop the writer thread and return the totals.
+        Raises the WriteError that stopped the writer, if any.
+        """
+        try:
+            if not self._task.done():
+                await self._enqueue(None)
+            await self._task
+        finally:
+            self._executor.shutdown()
+        return self.totals
@@ -0,0 +1,96 @@
+# JSON decoding backend: orjson or msgspec when installed, the standard library otherwise.
+# Every decoder accepts the raw response bytes, so no intermediate str copy is needed.
+import json
+from typing import Any, Optional, TypedDict
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    BACKEND = 'orjson'
+    loads = orjson.loads
+elif msgspec is not None:
+    BACKEND = 'msgspec'
+    loads = msgspec.json.decode
+else:
+    BACKEND = 'json'
+    loads = json.loads
+
+# orjson.JSONDecodeError already subclasses json.JSONDecodeError.
+DECODE_ERRORS = (json.JSONDecodeError, msgspec.DecodeError) if msgspec is not None else (json.JSONDecodeError,)
+
+
+# Schema of a job_postings page, restricted to the fields parse_job_postings reads.
+# Unknown keys are skipped by msgspec without being materialized.
+class Location(TypedDict, total=False):
+    label: Any
+
+
+class Company(TypedDict, total=False):
+    name: Any
+
+
+class JobInfo(TypedDict, total=False):
+    nameForUserSlug: Any
+
+
+class SkillJob(TypedDict, total=False):
+    description: Any
+
+
+class Skill(TypedDict, total=False):
+    name: Any
+    slug: Any
+    skillJobs: Optional[list[SkillJob]]
+
+
+JobPosting = TypedDict('JobPosting', {
+    '@id': Any,
+    'id': Any,
+    'title': Any,
+    'location': Optional[Location],
+    'company': Optional[Company],
+    'job': Optional[JobInfo],
+    'description': Any,
+    'candidateProfile': Any,
+    'skills': Optional[list[Skill]],
+    'experienceLevel': Any,
+    'durationValue': Any,
+    'durationPeriod': Any,
+    'remoteMode': Any,
+    'dailySalary': Any,
+    'minDailySalary': Any,
+    'maxDailySalary': Any,
+    'startsAt': Any,
+    'expiredAt': Any,
+    'publishedAt': Any,
+    'contracts': Any,
+}, total=False)
+
+HydraView = TypedDict('HydraView', {'hydra:next': Any}, total=False)
+
+JobPage = TypedDict('JobPage', {
+    'hydra:member': list[JobPosting],
+    'hydra:view': HydraView,
+    'hydra:totalItems': Any,
+}, total=False)
+
+_job_page_decoder = msgspec.json.Decoder(JobPage) if msgspec is not None else None
+
+
+def decode_job_page(data):
+    """
+    Decode a job_postings response body. With msgspec installed, only the fields
+    listed in JobPage are built; otherwise the whole document is decoded with `loads`.
+    """
+    if _job_page_decoder is not None:
+        return _job_page_decoder.decode(data)
+    return loads(data)
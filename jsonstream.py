@@ -0,0 +1,134 @@
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+
+
+class HydraPageStream:
+    """
+    Incrementally decode a Hydra collection page ({"hydra:member": [...], ...})
+    from an async iterator of byte chunks.
+
+    Iterating over `members()` yields each 'hydra:member' item as soon as it has been
+    received, so only the item being decoded is held in memory. The other top-level
+    keys ('hydra:view', 'hydra:totalItems', ...) are collected in `meta` and are complete
+    once the iteration is over.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self.meta = {}
+        self.member_count = 0
+        self.byte_count = 0
+
+    async def _fill(self):
+        """Append the next chunk to the buffer. Returns False at the end of the stream."""
+        if self._eof:
+            return False
+        if self._pos > 65536:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            self._buffer += self._utf8.decode(b'', final=True)
+            return False
+        if chunk:
+            self.byte_count += len(chunk)
+            self._buffer += self._utf8.decode(chunk)
+        return True
+
+    def _error(self, message):
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    async def _peek(self):
+        """Skip whitespace and return the next character, or '' at the end of the stream."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not await self._fill():
+                return ''
+
+    async def _expect(self, char):
+        if await self._peek() != char:
+            raise self._error(f"Expecting '{char}'")
+        self._pos += 1
+
+    async def _value(self):
+        """Decode the next complete JSON value, reading more chunks until it is available."""
+        await self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not await self._fill():
+                    raise
+                continue
+            # A number or literal ending exactly at the buffer end may continue in the next chunk.
+            if end == len(self._buffer) and not self._eof:
+                await self._fill()
+                continue
+            self._pos = end
+            return value
+
+    async def members(self):
+        """Yield the 'hydra:member' items one by one."""
+        await self._expect('{')
+        if await self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = await self._value()
+            if not isinstance(key, str):
+                raise self._error("Expecting property name")
+            await self._expect(':')
+            if key == 'hydra:member':
+                await self._expect('[')
+                if await self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        item = await self._value()
+                        self.member_count += 1
+                        yield item
+                        separator = await self._peek()
+                        self._pos += 1
+                        if separator == ']':
+                            break
+                        if separator != ',':
+                            raise self._error("Expecting ',' or ']'")
+            else:
+                self.meta[key] = await self._value()
+
+            separator = await self._peek()
+            self._pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise self._error("Expecting ',' or '}'")
+
+    async def batches(self, size):
+        """Yield the 'hydra:member' items in lists of up to `size` items."""
+        batch = []
+        async for item in self.members():
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def next_page(self):
+        """The raw 'hydra:next' link, available once the members have been consumed."""
+        return self.meta.get('hydra:view', {}).get('hydra:next')
+
+    def is_last_page(self):
+        return not self.member_count or not self.next_page()
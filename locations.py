@@ -0,0 +1,266 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+
+INTERNATIONAL_KEYWORDS = {
+    "angleterre",
+    "england",
+    "uk",
+    "united kingdom",
+    "royaume uni",
+    "belgique",
+    "belgium",
+    "suisse",
+    "switzerland",
+    "canada",
+    "luxembourg",
+    "allemagne",
+    "germany",
+    "espagne",
+    "spain",
+    "italie",
+    "italy",
+    "portugal",
+    "maroc",
+    "tunisie",
+    "algerie",
+    "algeria",
+}
+
+FRENCH_DEPARTMENTS = {
+    "ain",
+    "aisne",
+    "allier",
+    "alpes de haute provence",
+    "hautes alpes",
+    "alpes maritimes",
+    "ardeche",
+    "ardennes",
+    "ariege",
+    "aube",
+    "aude",
+    "aveyron",
+    "bouches du rhone",
+    "calvados",
+    "cantal",
+    "charente",
+    "charente maritime",
+    "cher",
+    "correze",
+    "corse du sud",
+    "haute corse",
+    "cote d or",
+    "cotes d armor",
+    "creuse",
+    "dordogne",
+    "doubs",
+    "drome",
+    "eure",
+    "eure et loir",
+    "finistere",
+    "gard",
+    "haute garonne",
+    "gers",
+    "gironde",
+    "herault",
+    "ille et vilaine",
+    "indre",
+    "indre et loire",
+    "isere",
+    "jura",
+    "landes",
+    "loir et cher",
+    "loire",
+    "haute loire",
+    "loire atlantique",
+    "loiret",
+    "lot",
+    "lot et garonne",
+    "lozere",
+    "maine et loire",
+    "manche",
+    "marne",
+    "haute marne",
+    "mayenne",
+    "meurthe et moselle",
+    "meuse",
+    "morbihan",
+    "moselle",
+    "nievre",
+    "nord",
+    "oise",
+    "orne",
+    "pas de calais",
+    "puy de dome",
+    "pyrenees atlantiques",
+    "hautes pyrenees",
+    "pyrenees orientales",
+    "bas rhin",
+    "haut rhin",
+    "rhone",
+    "haute saone",
+    "saone et loire",
+    "sarthe",
+    "savoie",
+    "haute savoie",
+    "paris",
+    "seine maritime",
+    "seine et marne",
+    "yvelines",
+    "deux sevres",
+    "somme",
+    "tarn",
+    "tarn et garonne",
+    "var",
+    "vaucluse",
+    "vendee",
+    "vienne",
+    "haute vienne",
+    "vosges",
+    "yonne",
+    "territoire de belfort",
+    "essonne",
+    "hauts de seine",
+    "seine saint denis",
+    "val de marne",
+    "val d oise",
+    "guadeloupe",
+    "martinique",
+    "guyane",
+    "la reunion",
+    "mayotte",
+}
+
+
+# Bump when the normalization rules change, so update.py re-processes older documents.
+LOCATION_VERSION = 1
+
+# Location strings repeat heavily across postings, so the helpers below are memoized.
+CACHE_SIZE = 65536
+
+WHITESPACE_RE = re.compile(r"\s+")
+LOCATION_SEPARATORS_RE = re.compile(r"[,./;\n]+")
+
+# One alternation over every keyword, matched on whole words of the canonical token
+# (longest keywords first so "united kingdom" wins over shorter overlaps).
+INTERNATIONAL_RE = re.compile(
+    r"\b(?:"
+    + "|".join(re.escape(keyword) for keyword in sorted(INTERNATIONAL_KEYWORDS, key=len, reverse=True))
+    + r")\b"
+)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_text(value: str | None) -> str | None:
+    if not value:
+        return None
+    normalized = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    normalized = WHITESPACE_RE.sub(" ", normalized).strip()
+    return normalized or None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonical_token(value: str | None) -> str | None:
+    normalized = normalize_text(value)
+    if not normalized:
+        return None
+    token = normalized.lower().replace("-", " ").replace("'", " ")
+    token = WHITESPACE_RE.sub(" ", token).strip()
+    return token or None
+
+
+def is_french_department(value: str | None) -> bool:
+    token = canonical_token(value)
+    if not token:
+        return False
+    return token in FRENCH_DEPARTMENTS
+
+
+def token_is_international(value: str | None) -> bool:
+    token = canonical_token(value)
+    if not token:
+        return False
+    return INTERNATIONAL_RE.search(token) is not None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_location(location: str | None):
+    cleaned = normalize_text(location)
+    if not cleaned:
+        return None, None
+
+    parts = [p.strip() for p in LOCATION_SEPARATORS_RE.split(cleaned) if p and p.strip()]
+    if not parts:
+        return None, None
+
+    city = parts[0]
+    department = parts[1] if len(parts) > 1 else None
+    if any(token_is_international(part) for part in parts):
+        department = "international"
+        if token_is_international(city):
+            city = None
+    return city, department
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def resolve_location(location: str | None, city: str | None = None, department: str | None = None):
+    """Return the normalized (city, department) for a document, keeping existing values when set."""
+    city_from_location, department_from_location = parse_location(location)
+
+    existing_city = normalize_text(city)
+    existing_department = normalize_text(department)
+
+    new_city = existing_city or city_from_location
+    new_department = existing_department or department_from_location
+
+    # Strict rule requested:
+    # if department is not a known French department -> international
+    if new_department and not is_french_department(new_department):
+        new_department = "international"
+    if token_is_international(new_city) or token_is_international(new_department):
+        new_department = "international"
+        if token_is_international(new_city):
+            new_city = None
+    return new_city, new_department
+
+
+class LocationTable:
+    """
+    Precomputed resolve_location results keyed by (location, city, department).
+
+    Full scans see a few thousand distinct keys across far more documents, so each key
+    is resolved once. With a `path`, the table is loaded from and saved to a JSON file
+    so later runs start warm; a file written under another LOCATION_VERSION is ignored.
+    The table can be shared by the threads of a parallel migration.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == LOCATION_VERSION:
+                self.entries = {tuple(key): tuple(value) for key, value in data.get("entries", [])}
+
+    def resolve_many(self, keys):
+        """Resolve every key not in the table yet and return the table."""
+        with self._lock:
+            for key in set(keys).difference(self.entries):
+                self.entries[key] = resolve_location(*key)
+        return self.entries
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = [[list(key), list(value)] for key, value in self.entries.items()]
+        data = {"version": LOCATION_VERSION, "entries": entries}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
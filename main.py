@@ -1,112 +1,348 @@
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import aclosing
+from functools import partial
 from datetime import datetime
 import argparse
+import logging
 import sys
-from scraper import fetch_jobs
-from parser import parse_job_postings
-from db import init_db, insert_job
-from rnet import Emulation, Client
-
-
-async def main(all_pages=False):
-    base_url = "https://www.free-work.com/api/job_postings"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:140.0) Gecko/20100101 Firefox/140.0',
-        'Accept': 'application/ld+json',
-        'Accept-Language': 'fr',
-        'Accept-Encoding': 'gzip, deflate, br, zstd',
-        'Referer': 'https://www.free-work.com/fr/tech-it/jobs',
-        'x-requested-with': 'XMLHttpRequest',
-        'x-varnish-public': '1',
-        'sentry-trace': '3c3641bb8fc94ade9d599a5d87bdb0ac-8e7698169182f85e',
-        'baggage': 'sentry-environment=production,sentry-public_key=095ab97f02b34d54886e285685ac53e8,sentry-trace_id=3c3641bb8fc94ade9d599a5d87bdb0ac',
-        'Sec-Fetch-Dest': 'empty',
-        'Sec-Fetch-Mode': 'cors',
-        'Sec-Fetch-Site': 'same-origin',
-        'Connection': 'keep-alive',
-    }
+from scraper import crawl_pages, crawl_pages_streaming, create_client, page_url, RetryPolicy
+from cache import ResponseCache, NotModified
+from tags import load_tagger
+from parser import parse_members_in_executor
+from db import init_db, ensure_indexes, known_ids, BulkWriter, AsyncJobWriter, WriteError
+from metrics import METRICS, setup_logging, add_metrics_arguments
+from profiling import MEMORY, profiled, add_profiling_arguments
+
+logger = logging.getLogger(__name__)
+
+
+BASE_URL = "https://www.free-work.com/api/job_postings"
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:140.0) Gecko/20100101 Firefox/140.0',
+    'Accept': 'application/ld+json',
+    'Accept-Language': 'fr',
+    'Accept-Encoding': 'gzip, deflate, br, zstd',
+    'Referer': 'https://www.free-work.com/fr/tech-it/jobs',
+    'x-requested-with': 'XMLHttpRequest',
+    'x-varnish-public': '1',
+    'sentry-trace': '3c3641bb8fc94ade9d599a5d87bdb0ac-8e7698169182f85e',
+    'baggage': 'sentry-environment=production,sentry-public_key=095ab97f02b34d54886e285685ac53e8,sentry-trace_id=3c3641bb8fc94ade9d599a5d87bdb0ac',
+    'Sec-Fetch-Dest': 'empty',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'same-origin',
+    'Connection': 'keep-alive',
+}
+
+
+def page_size(all_pages):
+    """Items requested per page: whole pages for a full crawl, the latest 100 postings otherwise."""
+    return 1000 if all_pages else 100
+
+
+async def fetch_stage(queue, rnet_client, retry_policy, all_pages, concurrency, rate_limit, max_pages,
+                      stream, stream_batch_size, cache=None):
+    """
+    Producer: fetch and decode pages and put (page_number, members) batches on `queue`,
+    followed by (page_number, None) at the end of each page and a final None.
+    A page unchanged since it was cached is put as (page_number, NotModified).
+    The crawl only moves on once the consumer has marked every item of the current
+    page done (queue.task_done()), so at most `concurrency` pages are requested ahead
+    of it: with concurrency=1, a crawl stopped on page N never asks for page N+1.
+    Returns why the crawl stopped.
+    """
+    reason = 'last page'
+
+    async def end_page(item):
+        await queue.put(item)
+        await queue.join()
 
+    if cache is not None and cache.replay:
+        rate_limit = 0
     try:
-        mongo_client, collection = init_db()
-        print("MongoDB connection successful.")
+        # Cached pages are stored whole, so the cache always goes through crawl_pages.
+        if all_pages and stream and cache is None:
+            # Decode 'hydra:member' items as they arrive, so a page is never held in memory as a whole.
+            pages = crawl_pages_streaming(
+                BASE_URL, HEADERS, max_pages, items_per_page=page_size(all_pages), rate=rate_limit,
+                client=rnet_client, policy=retry_policy,
+            )
+            async with aclosing(pages):
+                async for current_page, page_stream in pages:
+                    if page_stream is None:
+                        logger.error("Stopping due to error in fetch_jobs_stream.")
+                        reason = 'fetch error'
+                        break
+                    async for batch in page_stream.batches(stream_batch_size):
+                        await queue.put((current_page, batch))
+                    METRICS.incr('bytes', page_stream.byte_count)
+                    await end_page((current_page, None))
+        else:
+            if not all_pages:
+                max_pages = 1
+            pages = crawl_pages(
+                BASE_URL, HEADERS, max_pages, items_per_page=page_size(all_pages),
+                concurrency=concurrency, rate=rate_limit, client=rnet_client, policy=retry_policy,
+                cache=cache,
+            )
+            async with aclosing(pages):
+                async for current_page, json_data in pages:
+                    if isinstance(json_data, NotModified):
+                        await end_page((current_page, json_data))
+                        continue
+                    if not json_data:
+                        logger.error("Stopping due to error in fetch_jobs.")
+                        reason = 'fetch error'
+                        break
+                    if not isinstance(json_data, dict) or 'hydra:member' not in json_data:
+                        logger.error("Invalid JSON structure or missing 'hydra:member'.")
+                        reason = 'fetch error'
+                        break
+                    await queue.put((current_page, json_data['hydra:member']))
+                    await end_page((current_page, None))
     except Exception as e:
-        print(f"MongoDB connection failed: {e}")
-        sys.exit(1)
+        logger.exception("Error fetching job postings: %s", e)
+        reason = 'fetch error'
+    await queue.put(None)
+    return reason
+
 
-    # You can still create an Rnet Client if you want,
-    # but it's not required for fetch_jobs() anymore.
-    rnet_client = Client(emulation=Emulation.Firefox143)
+async def run_crawl(collection, rnet_client, all_pages=False, concurrency=1, rate_limit=0.5, batch_size=1000,
+                    skip_unchanged=True, max_pages=10, incremental=False, known_threshold=0.0, parse_workers=0,
+                    stream=False, stream_batch_size=100, max_retries=3, retry_deadline=120.0, queue_size=2,
+                    cache=None, tagger=None):
+    """
+    Crawl Free-Work job postings and write them to `collection`, reusing the given
+    Mongo collection and HTTP client so long-running callers can keep them warm.
+    Pass a ResponseCache to send conditional requests and skip pages answered with
+    304, or a replaying one to crawl the cached pages without any network access.
+    A fetched page is committed to the cache only once its jobs are written, never in
+    a dry run; the jobs of a 304 page only get their `date` refreshed.
+    `tagger` replaces the default tags from tags.py.
+    With `collection=None` the jobs are parsed but nothing is read from or written to Mongo.
 
-    all_jobs = []
+    The crawl is a pipeline of fetch/decode -> parse/normalize -> write stages joined by
+    bounded queues; jobs are dropped once written and only counters are returned.
+    """
+    retry_policy = RetryPolicy(max_attempts=max_retries, deadline=retry_deadline)
+    executor = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 0 else None
+    # Writes run on their own thread so the next page downloads while this one is persisted.
+    writer = AsyncJobWriter(
+        BulkWriter(collection, batch_size=batch_size, skip_unchanged=skip_unchanged),
+        max_pending=queue_size,
+    ).start()
     current_date = datetime.now().strftime('%Y-%m-%d')
+    stats = {'pages': 0, 'jobs': 0, 'known': 0, 'not_modified': 0, 'stop_reason': None}
 
+    batches = asyncio.Queue(maxsize=queue_size)
+    fetcher = asyncio.create_task(fetch_stage(
+        batches, rnet_client, retry_policy, all_pages, concurrency, rate_limit, max_pages,
+        stream, stream_batch_size, cache,
+    ))
+
+    page_jobs = 0
+    known_count = 0
+    # Ids of the current page, stored with its cache entry for the date refresh of a later 304.
+    page_ids = []
+    commit_pages = cache is not None and not cache.replay and collection is not None
     try:
-        if all_pages:
-            current_page = 1
-            max_pages = 10
-            current_url = f"{base_url}?page=1&itemsPerPage=1000"
-
-            while current_page <= max_pages:
-                print(f"Fetching page {current_page}...")
-                json_data = await fetch_jobs(current_url, headers)
-                if not json_data:
-                    print("Stopping due to error in fetch_jobs.")
+        while True:
+            item = await batches.get()
+            if item is None:
+                stats['stop_reason'] = await fetcher
+                break
+            current_page, members = item
+
+            if isinstance(members, NotModified):
+                logger.info("Page %d not modified since it was cached, skipping.", current_page)
+                stats['pages'] += 1
+                stats['not_modified'] += 1
+                METRICS.incr('pages')
+                METRICS.incr('pages_not_modified')
+                await writer.touch(members.ids, current_date)
+                # Nothing was added to this page, so nothing newer can be found past it.
+                if incremental:
+                    stats['stop_reason'] = 'not modified'
                     break
+                batches.task_done()
+                continue
 
+            if members is not None:
                 try:
-                    job_listings, next_page = parse_job_postings(json_data, current_date)
+                    with METRICS.timer('parse'):
+                        job_listings = await parse_members_in_executor(
+                            members, current_date, executor, parse_workers, tagger,
+                        )
                 except Exception as e:
-                    print(f"Error parsing job postings: {e}")
+                    logger.exception("Error parsing job postings: %s", e)
+                    stats['stop_reason'] = 'parse error'
                     break
+                if incremental and job_listings and collection is not None:
+                    known_count += len(known_ids(collection, [job.id for job in job_listings]))
+                page_jobs += len(job_listings)
+                if commit_pages:
+                    page_ids.extend(job.id for job in job_listings)
+                await writer.put(job_listings, flush=False)
+                batches.task_done()
+                continue
 
-                all_jobs.extend(job_listings)
-                for job in job_listings:
-                    try:
-                        insert_job(collection, job)
-                    except Exception as e:
-                        print(f"Error inserting job: {e}")
-                        continue
+            # End of page: flush it, commit its cache entry once written, and decide whether to go on.
+            on_written = None
+            if commit_pages:
+                on_written = partial(cache.commit, page_url(BASE_URL, current_page, page_size(all_pages)), page_ids)
+                page_ids = []
+            await writer.put([], flush=True, on_written=on_written)
+            logger.info("Processed %d jobs from page %d.", page_jobs, current_page)
+            stats['pages'] += 1
+            stats['jobs'] += page_jobs
+            stats['known'] += known_count
+            METRICS.incr('pages')
+            METRICS.incr('jobs', page_jobs)
+            MEMORY.snapshot(f'page-{current_page}')
 
-                print(f"Inserted {len(job_listings)} jobs from page {current_page}.")
+            # Postings come newest first: once a page holds a stored posting, everything
+            # after it was seen by a previous run. A threshold above 0 asks for a larger
+            # share of known postings before stopping.
+            known_share = known_count / page_jobs if page_jobs else 0.0
+            page_known = known_count
+            page_jobs = 0
+            known_count = 0
+            if incremental and page_known and known_share >= known_threshold:
+                logger.info("Page %d is %.0f%% already known, stopping incremental crawl.",
+                            current_page, known_share * 100)
+                stats['stop_reason'] = 'known page'
+                break
+            # Only now may the fetcher go on to the next page; items that end the
+            # crawl are never marked done, so it stays blocked until cancelled.
+            batches.task_done()
 
-                if not next_page or current_page == max_pages:
-                    break
+        stats['writes'] = await writer.close()
+        stats['fetch_latency'] = retry_policy.latency_summary()
 
-                current_url = f"https://www.free-work.com{next_page}"
-                current_page += 1
-                await asyncio.sleep(2)
+        totals = stats['writes']
+        logger.info("Total jobs processed: %d over %d pages (matched=%d, upserted=%d, modified=%d, "
+                    "touched=%d, unchanged=%d)", stats['jobs'], stats['pages'], totals['matched'],
+                    totals['upserted'], totals['modified'], totals['touched'], totals['unchanged'])
+        latency = stats['fetch_latency']
+        if latency['count']:
+            logger.info("Fetch attempts: %d, latency p50=%.2fs, p95=%.2fs, max=%.2fs",
+                        latency['count'], latency['p50'], latency['p95'], latency['max'])
+        return stats
+    finally:
+        fetcher.cancel()
+        await asyncio.gather(fetcher, return_exceptions=True)
+        if executor is not None:
+            executor.shutdown()
+        # Only left running when the crawl stopped early; still persist what was already queued,
+        # including jobs of a partial page buffered with flush=False.
+        await writer.close()
 
-        else:
-            current_url = f"{base_url}?page=1&itemsPerPage=100"
-            json_data = await fetch_jobs(current_url, headers)
-            if json_data:
-                try:
-                    job_listings, _ = parse_job_postings(json_data, current_date)
-                    all_jobs.extend(job_listings)
-                    for job in job_listings:
-                        insert_job(collection, job)
-                except Exception as e:
-                    print(f"Error processing single page: {e}")
-                    sys.exit(1)
 
-        print(f"Total jobs inserted: {len(all_jobs)}")
-        return all_jobs
+async def main(timeout=30, dry_run=False, **crawl_options):
+    mongo_client = collection = None
+    if dry_run:
+        logger.info("Dry run: jobs are parsed but not written to MongoDB.")
+    else:
+        try:
+            mongo_client, collection = init_db()
+            ensure_indexes(collection)
+        except Exception as e:
+            logger.error("MongoDB connection failed: %s", e)
+            sys.exit(1)
 
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        sys.exit(1)
+    # One client for the whole run, so every page reuses the pooled connections.
+    rnet_client = create_client(timeout=timeout)
+
+    try:
+        return await run_crawl(collection, rnet_client, **crawl_options)
     finally:
-        mongo_client.close()
+        if mongo_client is not None:
+            mongo_client.close()
+
+
+def add_crawl_arguments(parser):
+    """Register the crawl options shared by main.py and service.py."""
+    parser.add_argument('--all', type=lambda s: s.lower() == 'true', default=False,
+                        help="Set to 'true' to scrape up to --max-pages pages, or 'false' for one page.")
+    parser.add_argument('--max-pages', type=int, default=10,
+                        help="Maximum number of pages crawled when scraping all pages (default: 10).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Stop crawling after the first page that holds jobs already stored.")
+    parser.add_argument('--known-threshold', type=float, default=0.0,
+                        help="Share of already stored jobs on a page that stops an incremental crawl; "
+                             "the default 0.0 stops on the first page holding any stored job.")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Number of pages fetched in parallel when scraping all pages (default: 1).")
+    parser.add_argument('--rate-limit', type=float, default=0.5,
+                        help="Maximum requests per second sent to the host, 0 to disable (default: 0.5).")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="Maximum number of jobs per bulk write (default: 1000).")
+    parser.add_argument('--rewrite-unchanged', action='store_true',
+                        help="Replace every job even when its content fingerprint is unchanged.")
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="Number of worker processes used to parse pages, 0 to parse inline (default: 0).")
+    parser.add_argument('--stream', action='store_true',
+                        help="Decode pages incrementally from the response stream when scraping all pages.")
+    parser.add_argument('--stream-batch-size', type=int, default=100,
+                        help="Number of streamed jobs parsed and written together (default: 100).")
+    parser.add_argument('--timeout', type=int, default=30,
+                        help="Total timeout in seconds for each HTTP request (default: 30).")
+    parser.add_argument('--max-retries', type=int, default=3,
+                        help="Maximum number of attempts per page (default: 3).")
+    parser.add_argument('--retry-deadline', type=float, default=120.0,
+                        help="Maximum time in seconds spent retrying a single page (default: 120).")
+    parser.add_argument('--cache-dir',
+                        help="Directory of the HTTP response cache used for conditional requests.")
+    parser.add_argument('--replay', action='store_true',
+                        help="Serve pages from --cache-dir only, without any network access.")
+    parser.add_argument('--tags-config',
+                        help="JSON file mapping each tag to a list of regular expressions (default: tags.py).")
+
+
+def crawl_options(args):
+    """Map parsed crawl arguments to run_crawl() keyword arguments."""
+    if args.replay and not args.cache_dir:
+        raise SystemExit("--replay requires --cache-dir")
+    return {
+        'all_pages': args.all,
+        'concurrency': args.concurrency,
+        'rate_limit': args.rate_limit,
+        'batch_size': args.batch_size,
+        'skip_unchanged': not args.rewrite_unchanged,
+        'max_pages': args.max_pages,
+        'incremental': args.incremental,
+        'known_threshold': args.known_threshold,
+        'parse_workers': args.parse_workers,
+        'stream': args.stream,
+        'stream_batch_size': args.stream_batch_size,
+        'max_retries': args.max_retries,
+        'retry_deadline': args.retry_deadline,
+        'cache': ResponseCache(args.cache_dir, replay=args.replay) if args.cache_dir else None,
+        'tagger': load_tagger(args.tags_config) if args.tags_config else None,
+    }
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Free-Work Job Scraper")
-    parser.add_argument('--all', type=lambda s: s.lower() == 'true', default=False,
-                        help="Set to 'true' to scrape 10 pages, or 'false' for one page.")
+    add_crawl_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profiling_arguments(parser)
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Fetch and parse without connecting to MongoDB; with --replay the run is fully offline.")
     args = parser.parse_args()
+    setup_logging(args.log_level)
 
     try:
-        asyncio.run(main(all_pages=args.all))
+        with MEMORY.tracking(args.tracemalloc), profiled(args.profile):
+            asyncio.run(main(timeout=args.timeout, dry_run=args.dry_run, **crawl_options(args)))
+    except WriteError as e:
+        logger.error("MongoDB write failed: %s", e)
+        sys.exit(1)
     except Exception as e:
-        print(f"Main execution failed: {e}")
+        logger.exception("Main execution failed: %s", e)
         sys.exit(1)
+    finally:
+        summary = METRICS.write_report(args.metrics_json, args.metrics_prometheus)
+        logger.info("Run summary: %.1fs, %.2f pages/s, %.1f jobs/s, %d bytes",
+                    summary['elapsed'], summary['pages_per_second'] or 0, summary['jobs_per_second'] or 0,
+                    summary['counters'].get('bytes', 0))
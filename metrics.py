@@ -0,0 +1,144 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Latencies kept per timer for the percentiles; counts and totals cover every sample.
+MAX_SAMPLES = 10000
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+def setup_logging(level='INFO'):
+    """Configure the root logger for the command line entry points."""
+    logging.basicConfig(level=getattr(logging, str(level).upper(), logging.INFO), format=LOG_FORMAT)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[int(fraction * (len(sorted_values) - 1))]
+
+
+class Timer:
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        return {
+            'count': self.count,
+            'total': self.total,
+            'p50': percentile(samples, 0.50),
+            'p95': percentile(samples, 0.95),
+            'max': samples[-1] if samples else None,
+        }
+
+
+class Metrics:
+    """
+    Process-wide counters and timers for the crawl and migration stages.
+
+    Safe to update from the Mongo writer thread. Work done in parse worker processes
+    (--parse-workers) is only visible through the timers of the parent process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.monotonic()
+            self.counters = {}
+            self.timers = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                timer = self.timers[name] = Timer()
+            timer.count += 1
+            timer.total += seconds
+            timer.samples.append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Time the enclosed block under `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def summary(self):
+        """Counters, per-timer latencies and throughput since the last reset."""
+        elapsed = time.monotonic() - self.started
+        with self._lock:
+            counters = dict(self.counters)
+            timers = {name: timer.summary() for name, timer in self.timers.items()}
+
+        def rate(name):
+            return counters.get(name, 0) / elapsed if elapsed else None
+
+        return {
+            'elapsed': elapsed,
+            'pages_per_second': rate('pages'),
+            'jobs_per_second': rate('jobs'),
+            'bytes_per_second': rate('bytes'),
+            'counters': counters,
+            'timers': timers,
+        }
+
+    def to_prometheus(self, prefix='freework'):
+        """Render the counters and timers in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = []
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, timer in sorted(summary['timers'].items()):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for quantile in ('p50', 'p95'):
+                if timer[quantile] is not None:
+                    lines.append(f'{metric}{{quantile="0.{quantile[1:]}"}} {timer[quantile]}')
+            lines.append(f"{metric}_sum {timer['total']}")
+            lines.append(f"{metric}_count {timer['count']}")
+        lines.append(f"# TYPE {prefix}_elapsed_seconds gauge")
+        lines.append(f"{prefix}_elapsed_seconds {summary['elapsed']}")
+        return '\n'.join(lines) + '\n'
+
+    def write_report(self, json_path=None, prometheus_path=None):
+        """Write the summary as JSON and/or Prometheus text, and return it."""
+        summary = self.summary()
+        if json_path:
+            with open(json_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+        if prometheus_path:
+            with open(prometheus_path, 'w') as f:
+                f.write(self.to_prometheus())
+        return summary
+
+
+METRICS = Metrics()
+
+
+def add_metrics_arguments(parser):
+    """Register the logging and report options shared by the entry points."""
+    parser.add_argument('--log-level', default='INFO',
+                        help="Logging level: DEBUG, INFO, WARNING or ERROR (default: INFO).")
+    parser.add_argument('--metrics-json',
+                        help="Write the end-of-run metrics summary to this JSON file.")
+    parser.add_argument('--metrics-prometheus',
+                        help="Write the end-of-run metrics in Prometheus text format to this file.")
@@ -0,0 +1,57 @@
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class Skill:
+    slug: str | None = None
+    descriptions: list = field(default_factory=list)
+
+    def to_document(self):
+        document = {'descriptions': self.descriptions}
+        if self.slug is not None:
+            document['slug'] = self.slug
+        return document
+
+
+@dataclass(slots=True)
+class JobRecord:
+    """
+    A parsed job posting. Missing values are kept as None and left out of the
+    Mongo document instead of being stored as an 'N/A' placeholder.
+    """
+    id: int | None
+    date: str
+    title: str | None = None
+    location: str | None = None
+    city: str | None = None
+    department: str | None = None
+    location_version: int | None = None
+    company: str | None = None
+    description: str | None = None
+    candidate_profile: str | None = None
+    skills: list = field(default_factory=list)
+    experience_level: str | None = None
+    duration: str | None = None
+    remote_mode: str | None = None
+    daily_salary: str | None = None
+    starts_at: str | None = None
+    expired_at: str | None = None
+    published_at: str | None = None
+    contracts: list = field(default_factory=list)
+    source: str = 'freework'
+    url: str | None = None
+    scraping: bool = False
+    tags: list = field(default_factory=list)
+    fingerprint: str | None = None
+
+    def to_document(self):
+        """Serialize to the Mongo document, omitting absent values."""
+        document = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            if name == 'skills':
+                value = [skill.to_document() for skill in value]
+            document[name] = value
+        return document
@@ -1,104 +1,130 @@
+import asyncio
+import logging
 import re
+import hashlib
+import json
 from bs4 import BeautifulSoup
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs, urlencode
 from utils import clean_html
+from locations import resolve_location, LOCATION_VERSION
+from models import JobRecord, Skill
+from metrics import METRICS
+from tags import DEFAULT_TAGGER, WEB_SCRAPING_TAG
+
+logger = logging.getLogger(__name__)
 
 def search_scraping(description, candidate_profile):
     """
-    Search for the exact terms 'scraping' or 'web scraping' in the description and candidate profile.
+    Search for 'web scraping' (also spelled 'web-scraping' or 'webscraping') as whole
+    words in the description and candidate profile.
     Returns True if found, otherwise False.
     """
-    if not description:
-        description = ""
-    if not candidate_profile:
-        candidate_profile = ""
+    return WEB_SCRAPING_TAG in DEFAULT_TAGGER.scan(description, candidate_profile)
+
 
-    description = description.lower()
-    candidate_profile = candidate_profile.lower()
-    
-    if 'scraping' in description or 'scraping' in candidate_profile:
-        if 'web scraping' in description or 'web scraping' in candidate_profile:
-            return True
-    return False
+# Fields that change on every run without the posting itself changing.
+FINGERPRINT_EXCLUDED_FIELDS = {'date', 'fingerprint'}
 
 
-def parse_job_postings(json_data, current_date):
+def job_fingerprint(job_details):
     """
-    Parse the job data from JSON and return a list of job objects and the next page URL if available.
+    Return a stable hash of the posting content, ignoring bookkeeping fields such as the scraping date.
     """
-    job_listings = []
+    content = {k: v for k, v in job_details.items() if k not in FINGERPRINT_EXCLUDED_FIELDS}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
 
-    current_time = datetime.now().strftime("%I:%M %p CEST on %A, %B %d, %Y")
 
-    if not isinstance(json_data, dict) or 'hydra:member' not in json_data:
-        print("Error: Invalid JSON structure or missing 'hydra:member'.")
-        return job_listings, None
+def parse_job(job, current_date, tagger=None):
+    """
+    Parse a single 'hydra:member' entry into a JobRecord, tagged by `tagger`
+    (the default tags from tags.py when None).
+    """
+    skills = job.get('skills') or []
+
+    daily_salary = job.get('dailySalary', None)
+    if not daily_salary:
+        min_salary = job.get('minDailySalary')
+        max_salary = job.get('maxDailySalary')
+        if min_salary and max_salary:
+            daily_salary = f"{min_salary}-{max_salary} €"
+        elif min_salary:
+            daily_salary = f"{min_salary} €"
+        elif max_salary:
+            daily_salary = f"{max_salary} €"
+        else:
+            daily_salary = None
 
-    for job in json_data['hydra:member']:
-        skills = job.get('skills', [])
-        if skills:
-            for skill in skills:
-                skill.get('name', 'N/A')
-
-        daily_salary = job.get('dailySalary', None)
-        if not daily_salary:
-            min_salary = job.get('minDailySalary')
-            max_salary = job.get('maxDailySalary')
-            if min_salary and max_salary:
-                daily_salary = f"{min_salary}-{max_salary} €"
-            elif min_salary:
-                daily_salary = f"{min_salary} €"
-            elif max_salary:
-                daily_salary = f"{max_salary} €"
-            else:
-                daily_salary = 'N/A'
-
-        skills_data = []
-        for skill in skills:
-            skill_jobs = skill.get('skillJobs', [])
-            skill_entry = {
-                'slug': skill.get('slug', 'N/A'),
-                'descriptions': [s.get('description', 'N/A') for s in skill_jobs] if skill_jobs else ['N/A']
-            }
-            skills_data.append(skill_entry)
-
-        job_id = job.get('@id', '')
-        if job_id.startswith('/job_postings/'):
-            job_id = job_id.replace('/job_postings/', '/job-mission/')
-        name_for_user_slug = job.get('job', {}).get('nameForUserSlug', '')
-        job_url = f"https://www.free-work.com/fr/tech-it/{name_for_user_slug}{job_id}" if name_for_user_slug and job_id else 'N/A'
-
-        # Détection du scraping
-        scraping_detected = search_scraping(
-            job.get('description', ''),
-            job.get('candidateProfile', '')
+    skills_data = [
+        Skill(
+            slug=skill.get('slug'),
+            descriptions=[s.get('description') for s in skill.get('skillJobs') or []],
         )
+        for skill in skills
+    ]
+
+    job_id = job.get('@id', '')
+    if job_id.startswith('/job_postings/'):
+        job_id = job_id.replace('/job_postings/', '/job-mission/')
+    name_for_user_slug = job.get('job', {}).get('nameForUserSlug', '')
+    job_url = f"https://www.free-work.com/fr/tech-it/{name_for_user_slug}{job_id}" if name_for_user_slug and job_id else None
+
+    location_label = job.get('location', {}).get('label')
+    city, department = resolve_location(location_label)
+
+    duration = None
+    if job.get('durationValue'):
+        duration = " ".join(str(v) for v in (job.get('durationValue'), job.get('durationPeriod')) if v)
+
+    description = clean_html(job.get('description'))
+    candidate_profile = clean_html(job.get('candidateProfile'))
+    # Each cleaned text is scanned once. The description and profile also give the
+    # scraping flag; the title and skill slugs only add tags.
+    tagger = tagger or DEFAULT_TAGGER
+    text_tags = tagger.scan(description, candidate_profile)
+    other_tags = tagger.scan(job.get('title'), ' '.join(skill.slug for skill in skills_data if skill.slug))
+    tags = sorted(set(text_tags).union(other_tags))
+
+    record = JobRecord(
+        id=job.get('id'),
+        date=current_date,
+        title=job.get('title'),
+        location=location_label,
+        city=city,
+        department=department,
+        location_version=LOCATION_VERSION,
+        company=job.get('company', {}).get('name'),
+        description=description,
+        candidate_profile=candidate_profile,
+        skills=skills_data,
+        experience_level=job.get('experienceLevel'),
+        duration=duration,
+        remote_mode=job.get('remoteMode'),
+        daily_salary=daily_salary,
+        starts_at=job.get('startsAt'),
+        expired_at=job.get('expiredAt'),
+        published_at=job.get('publishedAt'),
+        contracts=job.get('contracts') or [],
+        url=job_url,
+        scraping=WEB_SCRAPING_TAG in text_tags,  # Ajout du champ 'scraping'
+        tags=tags,
+    )
+    record.fingerprint = job_fingerprint(record.to_document())
+    return record
+
+
+def parse_members(members, current_date, tagger=None):
+    """
+    Parse a list of 'hydra:member' entries, keeping their order.
+    """
+    return [parse_job(job, current_date, tagger) for job in members]
 
-        job_details = {
-            'id': job.get('id'),
-            'title': job.get('title', 'N/A'),
-            'location': job.get('location', {}).get('label', 'N/A'),
-            'company': job.get('company', {}).get('name', 'N/A'),
-            'description': clean_html(job.get('description', 'N/A')),
-            'candidate_profile': clean_html(job.get('candidateProfile', 'N/A')),
-            'skills': skills_data,
-            'experience_level': job.get('experienceLevel', 'N/A'),
-            'duration': f"{job.get('durationValue', 'N/A')} {job.get('durationPeriod', 'N/A')}" if job.get('durationValue') else 'N/A',
-            'remote_mode': job.get('remoteMode', 'N/A'),
-            'daily_salary': daily_salary,
-            'starts_at': job.get('startsAt', 'N/A'),
-            'expired_at': job.get('expiredAt', 'N/A'),
-            'published_at': job.get('publishedAt', 'N/A'),
-            'contracts': job.get('contracts', []),
-            'source': 'freework',
-            'date': current_date,
-            'url': job_url,
-            'scraping': scraping_detected  # Ajout du champ 'scraping'
-        }
-
-        job_listings.append(job_details)
 
+def parse_next_page(json_data):
+    """
+    Return the normalized relative URL of the next page, or None on the last page.
+    """
     next_page = json_data.get('hydra:view', {}).get('hydra:next', None)
     if next_page:
         parsed_url = urlparse(next_page)
@@ -108,5 +134,40 @@ def parse_job_postings(json_data, current_date):
         normalized_query = urlencode({'page': page, 'itemsPerPage': items_per_page})
         next_page = f"/api/job_postings?{normalized_query}"
 
-    print(f"Processed {len(job_listings)} jobs on this page")
+    return next_page
+
+
+def parse_job_postings(json_data, current_date, tagger=None):
+    """
+    Parse the job data from JSON and return a list of JobRecord objects and the next page URL if available.
+    """
+    job_listings = []
+
+    current_time = datetime.now().strftime("%I:%M %p CEST on %A, %B %d, %Y")
+
+    if not isinstance(json_data, dict) or 'hydra:member' not in json_data:
+        logger.error("Invalid JSON structure or missing 'hydra:member'.")
+        return job_listings, None
+
+    with METRICS.timer('parse'):
+        job_listings = parse_members(json_data['hydra:member'], current_date, tagger)
+    next_page = parse_next_page(json_data)
+
+    logger.debug("Processed %d jobs on this page", len(job_listings))
     return job_listings, next_page
+
+
+async def parse_members_in_executor(members, current_date, executor=None, workers=1, tagger=None):
+    """
+    Parse a batch of 'hydra:member' entries on `executor`, split into `workers` shards
+    that are parsed in parallel, or inline without an executor. Job order is preserved.
+    """
+    if executor is None:
+        return parse_members(members, current_date, tagger)
+    loop = asyncio.get_running_loop()
+    shard_size = max(1, -(-len(members) // max(1, workers)))
+    shards = await asyncio.gather(*(
+        loop.run_in_executor(executor, parse_members, members[i:i + shard_size], current_date, tagger)
+        for i in range(0, len(members), shard_size)
+    ))
+    return [job for shard in shards for job in shard]
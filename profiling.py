@@ -0,0 +1,119 @@
+import cProfile
+import logging
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per allocation; deeper stacks make snapshots much slower to take.
+TRACEMALLOC_FRAMES = 10
+
+
+@contextmanager
+def profiled(path=None, top=20):
+    """
+    Run the enclosed block under cProfile and dump the stats to `path` (a .pstats file
+    readable by pstats, snakeviz or flameprof). Does nothing when `path` is None.
+    Work done in parse worker processes is not included.
+    """
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logger.info("Profile written to %s", path)
+        if logger.isEnabledFor(logging.DEBUG):
+            stats = pstats.Stats(profiler)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+
+class MemoryTracker:
+    """
+    tracemalloc snapshots taken at page (or batch) boundaries.
+
+    Once started, every `snapshot(label)` is dumped to `<directory>/<n>-<label>.tracemalloc`
+    and the lines whose allocations grew the most since the previous snapshot are logged.
+    `snapshot()` is a no-op while the tracker is not started, and safe to call from the
+    migration worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.directory = None
+        self._previous = None
+        self._count = 0
+
+    @property
+    def active(self):
+        return self.directory is not None
+
+    def start(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self.directory = directory
+            self._previous = None
+            self._count = 0
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    def stop(self):
+        with self._lock:
+            if self.active:
+                tracemalloc.stop()
+                self.directory = None
+                self._previous = None
+
+    @contextmanager
+    def tracking(self, directory=None):
+        """Track allocations in the enclosed block when `directory` is given."""
+        if not directory:
+            yield
+            return
+        self.start(directory)
+        try:
+            yield
+        finally:
+            self.snapshot('end')
+            self.stop()
+
+    def snapshot(self, label, top=5):
+        if not self.active:
+            return
+        # One snapshot at a time: the count, the file names and the diff against the
+        # previous snapshot would otherwise interleave between threads.
+        with self._lock:
+            if not self.active:
+                return
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            self._count += 1
+            path = os.path.join(self.directory, f"{self._count:04d}-{label}.tracemalloc")
+            snapshot.dump(path)
+
+            current, peak = tracemalloc.get_traced_memory()
+            logger.info("Memory at %s: current=%.1f MiB, peak=%.1f MiB (%s)",
+                        label, current / 2 ** 20, peak / 2 ** 20, path)
+            if self._previous is not None:
+                for stat in snapshot.compare_to(self._previous, 'lineno')[:top]:
+                    logger.info("  %s", stat)
+            self._previous = snapshot
+
+
+MEMORY = MemoryTracker()
+
+
+def add_profiling_arguments(parser):
+    """Register the profiling options shared by main.py and update.py."""
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Run under cProfile and write the stats to PATH (.pstats).")
+    parser.add_argument('--tracemalloc', metavar='DIR',
+                        help="Trace allocations and dump a tracemalloc snapshot to DIR at every page boundary.")
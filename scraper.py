@@ -1,62 +1,368 @@
 import asyncio
-import json
+import logging
+import random
+import time
 import rnet
-from rnet import Method
+from rnet import Method, Client, Emulation
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from jsonstream import HydraPageStream
+from jsonlib import decode_job_page, DECODE_ERRORS
+from cache import NotModified
+from metrics import METRICS
 
-async def fetch_jobs(url, headers, max_retries=3):
+logger = logging.getLogger(__name__)
+
+def create_client(timeout=30, connect_timeout=10, pool_idle_timeout=90, pool_max_idle_per_host=8):
     """
-    Send an HTTP GET request using Rnet and return parsed JSON response.
-    Retries on failure.
+    Create the long-lived Rnet client shared by every request of a run.
+    Idle connections are kept in the pool so successive pages reuse the same TLS
+    session, and the Firefox emulation negotiates HTTP/2 so concurrent requests to
+    the host are multiplexed over it. Timeouts are in seconds.
+    """
+    return Client(
+        emulation=Emulation.Firefox143,
+        timeout=timeout,
+        connect_timeout=connect_timeout,
+        pool_idle_timeout=pool_idle_timeout,
+        pool_max_idle_per_host=pool_max_idle_per_host,
+        tcp_keepalive=60,
+    )
+
+
+async def send_get(url, headers, client=None):
+    """GET `url` through `client`, or through a one-off Rnet request when no client is given."""
+    if client is not None:
+        return await client.request(Method.GET, url, headers=headers)
+    return await rnet.request(Method.GET, url=url, headers=headers)
+
+
+class FetchError(Exception):
+    """A request for a page failed."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryableError(FetchError):
+    """A transient failure (redirect to a challenge page, 429, 5xx, timeout, truncated body)."""
+
+
+class FatalError(FetchError):
+    """A failure that retrying will not fix (4xx other than 408/425/429, invalid URL)."""
+
+
+RETRYABLE_STATUSES = {302, 408, 425, 429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header given either as delay-seconds or as an HTTP-date.
+    Returns the delay in seconds, or None when the header is missing or invalid.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter, bounded by an overall deadline per fetch.
+    The policy also records every attempt in `attempts`, so a run can report
+    per-attempt latencies.
+    """
+
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=30.0, jitter=0.5, deadline=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.deadline = deadline
+        self.attempts = []
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before attempt `attempt + 1`; a server-provided Retry-After wins if longer."""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay *= 1 - self.jitter * random.random()
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def record(self, url, attempt, status, latency, outcome):
+        self.attempts.append({
+            'url': url,
+            'attempt': attempt,
+            'status': status,
+            'latency': latency,
+            'outcome': outcome,
+        })
+
+    def latency_summary(self):
+        """Count, p50, p95 and max attempt latency in seconds."""
+        latencies = sorted(a['latency'] for a in self.attempts)
+        if not latencies:
+            return {'count': 0, 'p50': None, 'p95': None, 'max': None}
+        return {
+            'count': len(latencies),
+            'p50': latencies[int(0.50 * (len(latencies) - 1))],
+            'p95': latencies[int(0.95 * (len(latencies) - 1))],
+            'max': latencies[-1],
+        }
+
+
+async def check_response(resp):
+    """
+    Raise a RetryableError or FatalError unless the response is a 200, or a 304
+    answering a conditional request sent for a cached page.
     """
-    for attempt in range(1, max_retries + 1):
+    status_code = resp.status.as_int()
+    if status_code in (200, 304):
+        return
+    if status_code == 302:
+        redirect_url = resp.headers.get("Location", b"Unknown")
+        raise RetryableError(f"HTTP 302 redirect to {redirect_url.decode('latin-1', 'replace')}")
+
+    text = await resp.text()
+    message = f"HTTP Error {resp.status}: {text[:100]}..."
+    if status_code in RETRYABLE_STATUSES:
+        raise RetryableError(message, parse_retry_after(resp.headers.get("Retry-After")))
+    raise FatalError(message)
+
+
+async def fetch_with_retries(url, headers, read, client=None, policy=None):
+    """
+    GET `url` and return `await read(resp)` for the first 200 response.
+    Retryable failures are retried according to `policy`; fatal failures, exhausted
+    attempts and the deadline all return None.
+    """
+    policy = policy or RetryPolicy()
+    started = time.monotonic()
+    for attempt in range(1, policy.max_attempts + 1):
+        attempt_started = time.monotonic()
+        status_code = None
         try:
-            resp: rnet.Response = await rnet.request(
-                Method.GET,
-                url=url,
-                headers=headers
-            )
-
-            # Extract numeric status code safely
-            try:
-                status_code = int(str(resp.status).split()[0])
-            except Exception:
-                status_code = 0
-
-            print(f"Status Code: {resp.status}")
-
-            if status_code == 302:
-                redirect_url = resp.headers.get("Location", "Unknown")
-                print(f"HTTP 302 redirect to {redirect_url}")
-                if attempt < max_retries:
-                    print(f"Retrying ({attempt}/{max_retries}) after 10 seconds...")
-                    await asyncio.sleep(10)
-                    continue
-                return None
-
-            if status_code != 200:
-                text = await resp.text()
-                print(f"HTTP Error {resp.status}: {text[:100]}...")
-                if attempt < max_retries:
-                    print(f"Retrying ({attempt}/{max_retries}) after 10 seconds...")
-                    await asyncio.sleep(10)
-                    continue
-                return None
-
-            response_text = await resp.text()
-            if not response_text.strip():
-                print("Empty response received.")
-                return None
-
-            # Parse and return JSON content
-            return json.loads(response_text)
-
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
+            resp: rnet.Response = await send_get(url, headers, client)
+            status_code = resp.status.as_int()
+            logger.debug("Status Code: %s for %s", resp.status, url)
+            await check_response(resp)
+            result = await read(resp)
+            latency = time.monotonic() - attempt_started
+            policy.record(url, attempt, status_code, latency, 'ok')
+            METRICS.observe('fetch', latency)
+            METRICS.incr('requests')
+            return result
+        except FetchError as e:
+            error = e
+        except DECODE_ERRORS as e:
+            error = RetryableError(f"JSON decode error: {e}")
+        except (rnet.TimeoutError, rnet.ConnectionError, rnet.ConnectionResetError) as e:
+            error = RetryableError(f"Network error: {e}")
+        except (rnet.URLParseError, rnet.BuilderError) as e:
+            error = FatalError(f"Invalid request: {e}")
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            error = RetryableError(f"Unexpected error: {e}")
 
-        if attempt < max_retries:
-            print(f"Retrying ({attempt}/{max_retries}) after 10 seconds...")
-            await asyncio.sleep(10)
+        fatal = isinstance(error, FatalError)
+        latency = time.monotonic() - attempt_started
+        policy.record(url, attempt, status_code, latency, 'fatal' if fatal else 'retry')
+        METRICS.observe('fetch', latency)
+        METRICS.incr('requests')
+        METRICS.incr('request_errors')
+        logger.warning("%s (%s)", error, url)
+        if fatal or attempt == policy.max_attempts:
+            break
 
+        delay = policy.backoff(attempt, error.retry_after)
+        if time.monotonic() - started + delay > policy.deadline:
+            logger.warning("Giving up on %s: retry deadline of %ss reached.", url, policy.deadline)
+            break
+        logger.info("Retrying (%d/%d) after %.1f seconds...", attempt, policy.max_attempts, delay)
+        await asyncio.sleep(delay)
+
+    METRICS.incr('fetch_failures')
     return None
+
+
+def decode_body(body):
+    """Decode a job_postings body, recording its size and decode time."""
+    METRICS.incr('bytes', len(body))
+    if not body.strip():
+        logger.warning("Empty response received.")
+        return None
+    with METRICS.timer('decode'):
+        # Decode straight from the response bytes
+        return decode_job_page(body)
+
+
+async def read_job_page(resp):
+    return decode_body(await resp.bytes())
+
+
+def header_text(resp, name):
+    value = resp.headers.get(name)
+    return value.decode('latin-1') if value is not None else None
+
+
+async def fetch_jobs(url, headers, max_retries=3, client=None, policy=None, cache=None):
+    """
+    Send an HTTP GET request using Rnet and return parsed JSON response.
+    Retries on failure according to `policy` (by default `max_retries` attempts with
+    exponential backoff). Pass a `client` from create_client() to reuse pooled connections.
+
+    With a ResponseCache, the request is made conditional on the cached copy and a
+    NotModified marker is returned when the server answers 304, so the page does not
+    need to be decoded or parsed again. A 200 response is only staged in the cache;
+    the caller commits it once the page's jobs are stored. A replaying cache never
+    touches the network.
+    """
+    if cache is not None and cache.replay:
+        body = cache.body(url)
+        if body is None:
+            logger.warning("No cached response for %s.", url)
+            return None
+        return decode_body(body)
+
+    policy = policy or RetryPolicy(max_attempts=max_retries)
+    if cache is None:
+        return await fetch_with_retries(url, headers, read_job_page, client=client, policy=policy)
+
+    async def read_cached(resp):
+        if resp.status.as_int() == 304:
+            return cache.not_modified(url)
+        body = await resp.bytes()
+        json_data = decode_body(body)
+        if json_data is None:
+            return None
+        # Committed by the caller once the page's jobs are written.
+        cache.stage(
+            url, body,
+            etag=header_text(resp, 'ETag'),
+            last_modified=header_text(resp, 'Last-Modified'),
+            last_page=is_last_page(json_data),
+        )
+        return json_data
+
+    headers = {**headers, **cache.conditional_headers(url)}
+    return await fetch_with_retries(url, headers, read_cached, client=client, policy=policy)
+
+
+class HostRateLimiter:
+    """
+    Space out request starts so that each host sees at most `rate` requests per second.
+    A rate of 0 (or None) disables the limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+def page_url(base_url, page, items_per_page):
+    return f"{base_url}?page={page}&itemsPerPage={items_per_page}"
+
+
+def is_last_page(json_data):
+    """A page ends the crawl when it is empty or carries no 'hydra:next' link."""
+    if isinstance(json_data, NotModified):
+        return json_data.last_page
+    if not json_data or not json_data.get('hydra:member'):
+        return True
+    return not json_data.get('hydra:view', {}).get('hydra:next')
+
+
+async def crawl_pages(base_url, headers, max_pages, items_per_page=1000, concurrency=1, rate=0.5,
+                      client=None, policy=None, cache=None):
+    """
+    Fetch pages 1..max_pages with up to `concurrency` requests in flight and yield
+    (page_number, json_data) in page order. Stops after the first page that fails,
+    comes back empty or has no 'hydra:next'; pages still in flight are cancelled.
+    With a `cache`, json_data is a NotModified marker for pages unchanged since cached.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = HostRateLimiter(rate)
+
+    async def fetch_page(page):
+        url = page_url(base_url, page, items_per_page)
+        async with semaphore:
+            await limiter.wait(url)
+            logger.info("Fetching page %d...", page)
+            return await fetch_jobs(url, headers, client=client, policy=policy, cache=cache)
+
+    # Schedule at most `concurrency` pages ahead of the consumer, so decoded pages do
+    # not pile up in memory and a crawl that stops early does not request pages it
+    # never reads. With concurrency=1 the next page is only requested once the caller
+    # has taken the current one.
+    window = concurrency
+    pending = {}
+    next_page = 1
+    try:
+        for page in range(1, max_pages + 1):
+            while next_page <= max_pages and len(pending) < window:
+                pending[next_page] = asyncio.create_task(fetch_page(next_page))
+                next_page += 1
+
+            json_data = await pending.pop(page)
+            yield page, json_data
+            if is_last_page(json_data):
+                break
+    finally:
+        for task in pending.values():
+            task.cancel()
+        await asyncio.gather(*pending.values(), return_exceptions=True)
+
+
+async def fetch_jobs_stream(url, headers, max_retries=3, client=None, policy=None):
+    """
+    Like fetch_jobs, but return a HydraPageStream over the response body instead of
+    the decoded page, so 'hydra:member' items can be consumed as they arrive.
+    Only the request is retried: decoding errors surface while the stream is consumed.
+    """
+    async def open_stream(resp):
+        return HydraPageStream(resp.stream())
+
+    policy = policy or RetryPolicy(max_attempts=max_retries)
+    return await fetch_with_retries(url, headers, open_stream, client=client, policy=policy)
+
+
+async def crawl_pages_streaming(base_url, headers, max_pages, items_per_page=1000, rate=0.5,
+                                client=None, policy=None):
+    """
+    Sequential counterpart of crawl_pages that yields (page_number, HydraPageStream).
+    Each stream must be consumed before the next page is requested; the crawl stops
+    after a failed, empty or last page.
+    """
+    limiter = HostRateLimiter(rate)
+    for page in range(1, max_pages + 1):
+        url = page_url(base_url, page, items_per_page)
+        await limiter.wait(url)
+        logger.info("Fetching page %d...", page)
+        stream = await fetch_jobs_stream(url, headers, client=client, policy=policy)
+        yield page, stream
+        if stream is None or stream.is_last_page():
+            break
@@ -0,0 +1,98 @@
+import asyncio
+import argparse
+import logging
+import random
+import signal
+import time
+from db import init_db, ensure_indexes
+from scraper import create_client
+from update import migrate_locations
+from main import run_crawl, add_crawl_arguments, crawl_options
+from metrics import METRICS, setup_logging, add_metrics_arguments
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(name, job, interval, jitter, stop_event):
+    """
+    Run `job` every `interval` seconds (plus or minus up to `jitter` seconds) until
+    `stop_event` is set. A failing run is logged and does not stop the schedule.
+    """
+    while not stop_event.is_set():
+        started = time.monotonic()
+        logger.info("[%s] run started", name)
+        try:
+            await job()
+            logger.info("[%s] run finished in %.1fs", name, time.monotonic() - started)
+        except (Exception, SystemExit) as e:
+            # Crawl helpers exit on fatal errors, which must not take the service down.
+            logger.error("[%s] run failed: %r", name, e)
+
+        delay = interval + random.uniform(-jitter, jitter) - (time.monotonic() - started)
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=max(0.0, delay))
+        except asyncio.TimeoutError:
+            pass
+    logger.info("[%s] stopped", name)
+
+
+async def serve(args):
+    """Keep one Mongo client and one HTTP client warm and schedule crawl and normalize jobs."""
+    mongo_client, collection = init_db()
+    ensure_indexes(collection)
+    rnet_client = create_client(timeout=args.timeout)
+    options = crawl_options(args)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    # Metrics accumulate over the life of the service; the report is rewritten after every run.
+    async def crawl():
+        try:
+            await run_crawl(collection, rnet_client, **options)
+        finally:
+            METRICS.write_report(args.metrics_json, args.metrics_prometheus)
+
+    async def normalize():
+        try:
+            await asyncio.to_thread(
+                migrate_locations, collection, dry_run=False, batch_size=args.batch_size,
+            )
+        finally:
+            METRICS.write_report(args.metrics_json, args.metrics_prometheus)
+
+    jobs = [run_periodically('crawl', crawl, args.crawl_interval, args.jitter, stop_event)]
+    if args.normalize_interval > 0:
+        jobs.append(run_periodically('normalize', normalize, args.normalize_interval, args.jitter, stop_event))
+
+    logger.info(
+        "Service started. crawl_interval=%ss, normalize_interval=%ss, jitter=%ss",
+        args.crawl_interval, args.normalize_interval, args.jitter,
+    )
+    try:
+        await asyncio.gather(*jobs)
+    finally:
+        mongo_client.close()
+        logger.info("Service stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Free-Work scraper and location normalization as a service")
+    add_crawl_arguments(parser)
+    parser.add_argument('--crawl-interval', type=float, default=3600,
+                        help="Seconds between two crawls (default: 3600).")
+    parser.add_argument('--normalize-interval', type=float, default=0,
+                        help="Seconds between two location normalization passes, 0 to disable (default: 0).")
+    parser.add_argument('--jitter', type=float, default=60,
+                        help="Random offset in seconds added to each interval (default: 60).")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
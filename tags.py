@@ -0,0 +1,91 @@
+import json
+import re
+
+# Tag -> patterns (lowercase regular expressions, matched on whole words of the lowercased text).
+# A tags config file passed with --tags-config uses the same shape.
+DEFAULT_TAGS = {
+    'web-scraping': [r'web[ -]?scraping'],
+    'python': [r'python'],
+    'java': [r'java(?!\s*script)'],
+    'javascript': [r'javascript', r'js'],
+    'typescript': [r'typescript'],
+    'react': [r'react(?:\.?js)?'],
+    'angular': [r'angular(?:js)?'],
+    'vue': [r'vue(?:\.?js)?'],
+    'node': [r'node(?:\.?js)?'],
+    'php': [r'php', r'symfony', r'laravel'],
+    'golang': [r'golang'],
+    'rust': [r'rust'],
+    'dotnet': [r'\.net', r'c#', r'asp\.net'],
+    'cpp': [r'c\+\+'],
+    'sql': [r'sql', r'postgres(?:ql)?', r'mysql', r'oracle'],
+    'nosql': [r'nosql', r'mongo(?:db)?', r'cassandra', r'redis', r'elasticsearch'],
+    'aws': [r'aws', r'amazon web services'],
+    'azure': [r'azure'],
+    'gcp': [r'gcp', r'google cloud'],
+    'docker': [r'docker'],
+    'kubernetes': [r'kubernetes', r'k8s', r'openshift'],
+    'terraform': [r'terraform'],
+    'devops': [r'devops', r'ci/cd', r'jenkins', r'gitlab[ -]ci', r'ansible'],
+    'data-engineering': [r'data engineer(?:ing)?', r'etl', r'spark', r'airflow', r'kafka', r'databricks', r'dbt'],
+    'machine-learning': [r'machine learning', r'deep learning', r'apprentissage automatique', r'tensorflow', r'pytorch'],
+    'sap': [r'sap'],
+}
+
+# Tag behind the posting's 'scraping' flag. Every Tagger scans for it, with the default
+# patterns when a --tags-config file does not define it.
+WEB_SCRAPING_TAG = 'web-scraping'
+
+
+class Tagger:
+    """
+    Scan text for many tags in one pass.
+
+    Every tag becomes a named group inside its own zero-width lookahead, so each tag
+    is tested at every word start and overlapping tags are all reported: "web
+    scraping" yields a 'web' tag and a 'web-scraping' tag when both are defined.
+    """
+
+    def __init__(self, tags):
+        if WEB_SCRAPING_TAG not in tags:
+            tags = {WEB_SCRAPING_TAG: DEFAULT_TAGS[WEB_SCRAPING_TAG], **tags}
+        self.names = {}
+        alternatives = []
+        groups = []
+        for i, (tag, patterns) in enumerate(tags.items()):
+            group = f't{i}'
+            self.names[group] = tag
+            pattern = '|'.join(f'(?:{p})' for p in patterns)
+            alternatives.append(pattern)
+            groups.append(f"(?:(?=(?P<{group}>(?:{pattern})(?!\\w))))?")
+        # Whole words only, including around non-word characters such as "c#" or ".net".
+        # The leading lookaheads let the scan skip spaces, punctuation and words that
+        # start no tag cheaply; only then is every tag tried at that position.
+        # Matching lowercased text is faster than re.IGNORECASE.
+        self.regex = re.compile(
+            r'(?=[\w.])(?<!\w)(?=(?:' + '|'.join(alternatives) + r')(?!\w))' + ''.join(groups)
+        )
+
+    def scan(self, *texts):
+        """Return the sorted tags found in any of `texts` (None values are skipped)."""
+        found = set()
+        for text in texts:
+            if not text:
+                continue
+            for match in self.regex.finditer(text.lower()):
+                for group, value in match.groupdict().items():
+                    if value is not None:
+                        found.add(self.names[group])
+                if len(found) == len(self.names):
+                    return sorted(found)
+        return sorted(found)
+
+
+def load_tagger(path):
+    """Build a Tagger from a JSON file mapping each tag to a list of patterns."""
+    with open(path, 'r', encoding='utf-8') as f:
+        tags = json.load(f)
+    return Tagger(tags)
+
+
+DEFAULT_TAGGER = Tagger(DEFAULT_TAGS)
@@ -0,0 +1,22 @@
+from cache import ResponseCache
+
+
+def test_staged_page_is_not_cached_until_committed(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    url = 'https://example.com/api/job_postings?page=1&itemsPerPage=1000'
+    cache.stage(url, b'{"hydra:member": []}', etag='"p1"', last_page=True)
+    assert cache.conditional_headers(url) == {}
+    assert cache.urls() == []
+
+    cache.commit(url, [1, 2])
+    assert cache.conditional_headers(url) == {'If-None-Match': '"p1"'}
+    assert cache.body(url) == b'{"hydra:member": []}'
+    not_modified = cache.not_modified(url)
+    assert not_modified.last_page
+    assert not_modified.ids == [1, 2]
+
+
+def test_commit_without_staged_page(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.commit('https://example.com/unknown')
+    assert cache.urls() == []
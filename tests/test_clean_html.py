@@ -0,0 +1,53 @@
+import json
+import os
+
+import pytest
+
+from utils import clean_html, clean_html_bs4
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+with open(os.path.join(FIXTURES, 'descriptions.json'), encoding='utf-8') as f:
+    DESCRIPTIONS = json.load(f)
+
+
+@pytest.mark.parametrize('html_text', DESCRIPTIONS)
+def test_matches_bs4_on_descriptions(html_text):
+    assert clean_html(html_text) == clean_html_bs4(html_text)
+
+
+@pytest.mark.parametrize('html_text', [
+    '<p>Python<script>var x = 1;</script> &amp; Django</p><style>p { color: red; }</style>',
+    '<p><![CDATA[raw text]]></p>',
+    '<p>caf&eacute</p>',
+    'a &amp b',
+    'a &lt b',
+    'x&nbsp;y',
+])
+def test_matches_bs4(html_text):
+    assert clean_html(html_text) == clean_html_bs4(html_text)
+
+
+@pytest.mark.parametrize('html_text', [None, '', '<p></p>', '<p>&nbsp;</p>', '<script>x</script>'])
+def test_no_text(html_text):
+    assert clean_html(html_text) is None
+    assert clean_html_bs4(html_text) is None
+
+
+# Malformed character references, where the engines differ: the stream engine
+# follows html.unescape (HTML5), see the clean_html docstring.
+@pytest.mark.parametrize('html_text, expected', [
+    ('a &ampx b', 'a &x b'),
+    ('a &unknown; b', 'a &unknown; b'),
+    ('a &notit; b', 'a ¬it; b'),
+    ('R&D', 'R&D'),
+    ('AT&T', 'AT&T'),
+    ('&copy2024', '©2024'),
+])
+def test_malformed_entities(html_text, expected):
+    assert clean_html(html_text) == expected
+
+
+def test_bs4_engine():
+    html_text = DESCRIPTIONS[0]
+    assert clean_html(html_text, engine='bs4') == clean_html_bs4(html_text)
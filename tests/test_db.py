@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+from db import AsyncJobWriter, WriteError
+
+
+class FailingWriter:
+    """A BulkWriter stand-in whose writes fail after a delay, like a server-selection timeout."""
+
+    totals = {}
+
+    def add(self, job):
+        pass
+
+    def flush(self):
+        time.sleep(0.05)
+        raise WriteError("server selection timed out")
+
+
+async def put_until_failure(writer, puts):
+    for _ in range(puts):
+        await writer.put([{'id': 1}])
+
+
+def test_put_raises_when_writer_fails_with_full_queue():
+    async def run():
+        writer = AsyncJobWriter(FailingWriter(), max_pending=2).start()
+        with pytest.raises(WriteError):
+            await asyncio.wait_for(put_until_failure(writer, 10), timeout=5)
+        with pytest.raises(WriteError):
+            await asyncio.wait_for(writer.close(), timeout=5)
+
+    asyncio.run(run())
+
+
+def test_close_raises_when_writer_fails_with_full_queue():
+    async def run():
+        writer = AsyncJobWriter(FailingWriter(), max_pending=2).start()
+        await put_until_failure(writer, 3)
+        with pytest.raises(WriteError):
+            await asyncio.wait_for(writer.close(), timeout=5)
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from db import ensure_indexes
+from locations import LOCATION_VERSION
+from update import explain_query
+
+# explain() needs a real server; mongomock does not implement it.
+MONGO_TEST_URI = os.getenv('MONGO_TEST_URI', 'mongodb://localhost:27017')
+
+
+@pytest.fixture
+def mongod_collection():
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(MONGO_TEST_URI, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command('ping')
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"no MongoDB server at {MONGO_TEST_URI}")
+    collection = client['freework_test']['explain_query']
+    collection.drop()
+    yield collection
+    collection.drop()
+    client.close()
+
+
+def test_ensure_indexes():
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.jobs
+    ensure_indexes(collection)
+    indexes = collection.index_information()
+    assert indexes['id_unique']['unique']
+    assert {'published_at', 'date', 'department', 'scraping', 'location_version', 'tags'} <= set(indexes)
+
+
+def test_ensure_indexes_with_duplicate_ids():
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.jobs
+    collection.insert_many([{'id': 1}, {'id': 1}])
+    ensure_indexes(collection)
+    indexes = collection.index_information()
+    assert 'id_unique' not in indexes
+    assert {'location_version', 'tags'} <= set(indexes)
+
+
+def test_migration_query_uses_index(mongod_collection):
+    mongod_collection.insert_many(
+        [{'id': i, 'location_version': LOCATION_VERSION} for i in range(100)] + [{'id': 100}]
+    )
+    ensure_indexes(mongod_collection)
+    stages = explain_query(mongod_collection)
+    assert 'IXSCAN(location_version)' in stages
+    assert 'COLLSCAN' not in stages
+    assert explain_query(mongod_collection, full_scan=True) == ['COLLSCAN']
@@ -1,193 +1,35 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateMany, UpdateOne
 import os
 import sys
-import re
 import argparse
-import unicodedata
+import logging
 import time
-import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from urllib.parse import quote
+from bson import json_util
 from dotenv import load_dotenv
+# The location helpers moved to locations.py so the scraper can use them at parse time.
+from locations import (  # noqa: F401
+    INTERNATIONAL_KEYWORDS,
+    FRENCH_DEPARTMENTS,
+    normalize_text,
+    canonical_token,
+    is_french_department,
+    token_is_international,
+    parse_location,
+    resolve_location,
+    LocationTable,
+    LOCATION_VERSION,
+)
+from db import ensure_indexes
+from metrics import METRICS, setup_logging, add_metrics_arguments
+from profiling import MEMORY, profiled, add_profiling_arguments
 
 load_dotenv()
 
-INTERNATIONAL_KEYWORDS = {
-    "angleterre",
-    "england",
-    "uk",
-    "united kingdom",
-    "royaume uni",
-    "belgique",
-    "belgium",
-    "suisse",
-    "switzerland",
-    "canada",
-    "luxembourg",
-    "allemagne",
-    "germany",
-    "espagne",
-    "spain",
-    "italie",
-    "italy",
-    "portugal",
-    "maroc",
-    "tunisie",
-    "algerie",
-    "algeria",
-}
-
-FRENCH_DEPARTMENTS = {
-    "ain",
-    "aisne",
-    "allier",
-    "alpes de haute provence",
-    "hautes alpes",
-    "alpes maritimes",
-    "ardeche",
-    "ardennes",
-    "ariege",
-    "aube",
-    "aude",
-    "aveyron",
-    "bouches du rhone",
-    "calvados",
-    "cantal",
-    "charente",
-    "charente maritime",
-    "cher",
-    "correze",
-    "corse du sud",
-    "haute corse",
-    "cote d or",
-    "cotes d armor",
-    "creuse",
-    "dordogne",
-    "doubs",
-    "drome",
-    "eure",
-    "eure et loir",
-    "finistere",
-    "gard",
-    "haute garonne",
-    "gers",
-    "gironde",
-    "herault",
-    "ille et vilaine",
-    "indre",
-    "indre et loire",
-    "isere",
-    "jura",
-    "landes",
-    "loir et cher",
-    "loire",
-    "haute loire",
-    "loire atlantique",
-    "loiret",
-    "lot",
-    "lot et garonne",
-    "lozere",
-    "maine et loire",
-    "manche",
-    "marne",
-    "haute marne",
-    "mayenne",
-    "meurthe et moselle",
-    "meuse",
-    "morbihan",
-    "moselle",
-    "nievre",
-    "nord",
-    "oise",
-    "orne",
-    "pas de calais",
-    "puy de dome",
-    "pyrenees atlantiques",
-    "hautes pyrenees",
-    "pyrenees orientales",
-    "bas rhin",
-    "haut rhin",
-    "rhone",
-    "haute saone",
-    "saone et loire",
-    "sarthe",
-    "savoie",
-    "haute savoie",
-    "paris",
-    "seine maritime",
-    "seine et marne",
-    "yvelines",
-    "deux sevres",
-    "somme",
-    "tarn",
-    "tarn et garonne",
-    "var",
-    "vaucluse",
-    "vendee",
-    "vienne",
-    "haute vienne",
-    "vosges",
-    "yonne",
-    "territoire de belfort",
-    "essonne",
-    "hauts de seine",
-    "seine saint denis",
-    "val de marne",
-    "val d oise",
-    "guadeloupe",
-    "martinique",
-    "guyane",
-    "la reunion",
-    "mayotte",
-}
-
-
-def normalize_text(value: str | None) -> str | None:
-    if not value:
-        return None
-    normalized = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
-    normalized = re.sub(r"\s+", " ", normalized).strip()
-    return normalized or None
-
-
-def canonical_token(value: str | None) -> str | None:
-    normalized = normalize_text(value)
-    if not normalized:
-        return None
-    token = normalized.lower().replace("-", " ").replace("'", " ")
-    token = re.sub(r"\s+", " ", token).strip()
-    return token or None
-
-
-def is_french_department(value: str | None) -> bool:
-    token = canonical_token(value)
-    if not token:
-        return False
-    return token in FRENCH_DEPARTMENTS
-
-
-def token_is_international(value: str | None) -> bool:
-    token = canonical_token(value)
-    if not token:
-        return False
-    return any(keyword in token for keyword in INTERNATIONAL_KEYWORDS)
-
-
-def parse_location(location: str | None):
-    cleaned = normalize_text(location)
-    if not cleaned:
-        return None, None
-
-    parts = [p.strip() for p in re.split(r"[,./;\n]+", cleaned) if p and p.strip()]
-    if not parts:
-        return None, None
-
-    city = parts[0]
-    department = parts[1] if len(parts) > 1 else None
-    if any(token_is_international(part) for part in parts):
-        department = "international"
-        if token_is_international(city):
-            city = None
-    return city, department
+logger = logging.getLogger(__name__)
 
 
 def init_db():
@@ -197,28 +39,27 @@ def init_db():
     collection_name = os.getenv("MONGO_COLLECTION_FREEWORK") or os.getenv("MONGO_COLLECTION") or "freework"
 
     if uri:
-        print(f"Using MONGO_URI for db={db_name}, collection={collection_name}", file=sys.stderr)
+        logger.info("Using MONGO_URI for db=%s, collection=%s", db_name, collection_name)
         try:
             client = MongoClient(uri)
             client.admin.command("ping")
-            print("MongoDB connection successful", file=sys.stderr)
+            logger.info("MongoDB connection successful")
             return client, client[db_name][collection_name]
         except Exception as e:
-            print(f"MongoDB connection failed via MONGO_URI: {e}", file=sys.stderr)
+            logger.error("MongoDB connection failed via MONGO_URI: %s", e)
             sys.exit(1)
 
     user = os.getenv("MONGO_USER")
     password = os.getenv("MONGO_PASSWORD")
     host = os.getenv("MONGO_HOST")
 
-    print(
-        f"Fallback env: user={user}, host={host}, db={db_name}, collection={collection_name}, password_set={bool(password)}",
-        file=sys.stderr,
+    logger.info(
+        "Fallback env: user=%s, host=%s, db=%s, collection=%s, password_set=%s",
+        user, host, db_name, collection_name, bool(password),
     )
     if not all([user, password, host, db_name, collection_name]):
-        print(
-            "Missing env vars. Provide MONGO_URI or MONGO_USER/MONGO_PASSWORD/MONGO_HOST/MONGO_DB/MONGO_COLLECTION(_FREEWORK).",
-            file=sys.stderr,
+        logger.error(
+            "Missing env vars. Provide MONGO_URI or MONGO_USER/MONGO_PASSWORD/MONGO_HOST/MONGO_DB/MONGO_COLLECTION(_FREEWORK)."
         )
         sys.exit(1)
 
@@ -227,94 +68,392 @@ def init_db():
         uri = f"mongodb+srv://{user}:{encoded_password}@{host}/{db_name}?retryWrites=true&w=majority"
         client = MongoClient(uri)
         client.admin.command("ping")
-        print("MongoDB connection successful", file=sys.stderr)
+        logger.info("MongoDB connection successful")
         return client, client[db_name][collection_name]
     except Exception as e:
-        print(f"MongoDB connection failed via user/password: {e}", file=sys.stderr)
+        logger.error("MongoDB connection failed via user/password: %s", e)
         sys.exit(1)
 
 
-def migrate_locations(collection, dry_run: bool = True, full_scan: bool = False):
-    country_pattern = "angleterre|england|uk|united kingdom|royaume uni|belgique|belgium|suisse|switzerland|canada|luxembourg|allemagne|germany|espagne|spain|italie|italy|portugal|maroc|tunisie|algerie|algeria"
-
-    # Fast mode: only missing fields + obvious country tokens.
-    # Full mode: process every document to enforce strict department normalization.
-    if full_scan:
-        query = {}
-    else:
-        query = {
+MISSING_CITY_AND_DEPARTMENT = {
+    "$and": [
+        {
             "$or": [
-                {
-                    "$and": [
-                        {
-                            "$or": [
-                                {"city": {"$exists": False}},
-                                {"city": None},
-                                {"city": ""},
-                            ]
-                        },
-                        {
-                            "$or": [
-                                {"department": {"$exists": False}},
-                                {"department": None},
-                                {"department": ""},
-                            ]
-                        },
-                    ]
-                },
-                {"department": {"$regex": country_pattern, "$options": "i"}},
-                {"city": {"$regex": country_pattern, "$options": "i"}},
+                {"city": {"$exists": False}},
+                {"city": None},
+                {"city": ""},
             ]
-        }
+        },
+        {
+            "$or": [
+                {"department": {"$exists": False}},
+                {"department": None},
+                {"department": ""},
+            ]
+        },
+    ]
+}
+
 
-    cursor = collection.find(query, {"_id": 1, "id": 1, "location": 1, "city": 1, "department": 1})
+# Documents written by the scraper, or already migrated, carry the version of the rules
+# that normalized them; anything else still needs a pass. Unlike the regexes this used to
+# rely on, a $ne on an indexed field is answered from the index, as the two key ranges
+# on either side of the current version.
+NOT_NORMALIZED = {"location_version": {"$ne": LOCATION_VERSION}}
 
+MIGRATION_FIELDS = {"_id": 1, "id": 1, "location": 1, "city": 1, "department": 1, "location_version": 1}
+
+
+def flush_updates(collection, ops) -> int:
+    """Send a batch of update operations as one unordered bulk_write and return the modified count."""
+    if not ops:
+        return 0
+    with METRICS.timer("migrate_write"):
+        result = collection.bulk_write(ops, ordered=False)
+    logger.debug("Bulk update: sent=%d, modified=%d", len(ops), result.modified_count)
+    MEMORY.snapshot("bulk-update")
+    return result.modified_count
+
+
+def migrate_by_location(collection, dry_run: bool = True, batch_size: int = 1000) -> int:
+    """
+    Fill documents that have neither city nor department in one UpdateMany per distinct
+    location string, so the server applies each result to every matching document.
+    """
+    query = {"$and": [NOT_NORMALIZED, MISSING_CITY_AND_DEPARTMENT, {"location": {"$nin": [None, ""]}}]}
+    ops = []
+    updated = 0
+    for location in collection.distinct("location", query):
+        new_city, new_department = resolve_location(location)
+        if new_city is None and new_department is None:
+            continue
+        if dry_run:
+            matched = collection.count_documents({"$and": [query, {"location": location}]})
+            logger.debug(
+                "[DRY-RUN] %d documents with location='%s' => city='%s', department='%s'",
+                matched, location, new_city, new_department,
+            )
+            updated += matched
+            continue
+        ops.append(UpdateMany(
+            {"$and": [query, {"location": location}]},
+            {"$set": {"city": new_city, "department": new_department, "location_version": LOCATION_VERSION}},
+        ))
+        if len(ops) >= batch_size:
+            updated += flush_updates(collection, ops)
+            ops = []
+    updated += flush_updates(collection, ops)
+    logger.info("Location pass finished. updated=%d, dry_run=%s", updated, dry_run)
+    return updated
+
+
+def migrate_documents(collection, cursor, dry_run: bool, batch_size: int):
+    """Resolve and update the documents of `cursor` one at a time. Returns (scanned, updated, skipped)."""
     scanned = 0
     updated = 0
     skipped = 0
+    ops = []
 
     for doc in cursor:
         scanned += 1
-        city_from_location, department_from_location = parse_location(doc.get("location"))
-
-        existing_city = normalize_text(doc.get("city"))
-        existing_department = normalize_text(doc.get("department"))
-
-        new_city = existing_city or city_from_location
-        new_department = existing_department or department_from_location
-
-        # Strict rule requested:
-        # if department is not a known French department -> international
-        if new_department and not is_french_department(new_department):
-            new_department = "international"
-        if token_is_international(new_city) or token_is_international(new_department):
-            new_department = "international"
-            if token_is_international(new_city):
-                new_city = None
+        new_city, new_department = resolve_location(doc.get("location"), doc.get("city"), doc.get("department"))
 
         if new_city == doc.get("city") and new_department == doc.get("department"):
             skipped += 1
+            if not dry_run and doc.get("location_version") != LOCATION_VERSION:
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"location_version": LOCATION_VERSION}}))
+                if len(ops) >= batch_size:
+                    flush_updates(collection, ops)
+                    ops = []
             continue
 
-        update_fields = {"city": new_city, "department": new_department}
+        update_fields = {"city": new_city, "department": new_department, "location_version": LOCATION_VERSION}
 
         if dry_run:
-            print(
-                f"[DRY-RUN] id={doc.get('id')} location='{doc.get('location')}' => city='{new_city}', department='{new_department}'",
-                file=sys.stderr,
+            logger.debug(
+                "[DRY-RUN] id=%s location='%s' => city='%s', department='%s'",
+                doc.get('id'), doc.get('location'), new_city, new_department,
             )
         else:
-            collection.update_one({"_id": doc["_id"]}, {"$set": update_fields})
-            print(
-                f"Updated id={doc.get('id')} => city='{new_city}', department='{new_department}'",
-                file=sys.stderr,
-            )
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update_fields}))
+            if len(ops) >= batch_size:
+                flush_updates(collection, ops)
+                ops = []
         updated += 1
 
-    print(
-        f"Migration finished. scanned={scanned}, updated={updated}, skipped={skipped}, dry_run={dry_run}",
-        file=sys.stderr,
+    flush_updates(collection, ops)
+    return scanned, updated, skipped
+
+
+def migrate_batches(collection, cursor, dry_run: bool, batch_size: int, table: LocationTable, on_batch=None):
+    """
+    Resolve the documents of `cursor` `batch_size` at a time: each distinct
+    (location, city, department) is resolved once through `table`, and documents that end
+    up with the same values are updated together with one UpdateMany on their _ids.
+    `on_batch(last_id)` is called once a batch has been written.
+    Returns (scanned, updated, skipped).
+    """
+    scanned = 0
+    updated = 0
+    skipped = 0
+
+    while True:
+        docs = list(islice(cursor, batch_size))
+        if not docs:
+            break
+        scanned += len(docs)
+        keys = [(doc.get("location"), doc.get("city"), doc.get("department")) for doc in docs]
+        results = table.resolve_many(keys)
+
+        changed = defaultdict(list)
+        stamp_only = []
+        for doc, key in zip(docs, keys):
+            new_city, new_department = results[key]
+            if new_city == doc.get("city") and new_department == doc.get("department"):
+                skipped += 1
+                if doc.get("location_version") != LOCATION_VERSION:
+                    stamp_only.append(doc["_id"])
+                continue
+            updated += 1
+            if dry_run:
+                logger.debug(
+                    "[DRY-RUN] id=%s location='%s' => city='%s', department='%s'",
+                    doc.get('id'), doc.get('location'), new_city, new_department,
+                )
+            changed[(new_city, new_department)].append(doc["_id"])
+
+        if dry_run:
+            continue
+        ops = [
+            UpdateMany(
+                {"_id": {"$in": ids}},
+                {"$set": {"city": city, "department": department, "location_version": LOCATION_VERSION}},
+            )
+            for (city, department), ids in changed.items()
+        ]
+        if stamp_only:
+            ops.append(UpdateMany({"_id": {"$in": stamp_only}}, {"$set": {"location_version": LOCATION_VERSION}}))
+        flush_updates(collection, ops)
+        if on_batch is not None:
+            on_batch(docs[-1]["_id"])
+
+    return scanned, updated, skipped
+
+
+def split_points(collection, query, partitions: int, samples_per_partition: int = 100):
+    """
+    Pick `partitions - 1` _id boundaries from a $sample of the matching documents, so
+    each _id range holds roughly the same number of documents.
+    """
+    if partitions <= 1:
+        return []
+    sample = collection.aggregate([
+        {"$match": query},
+        {"$sample": {"size": partitions * samples_per_partition}},
+        {"$project": {"_id": 1}},
+    ])
+    ids = sorted(doc["_id"] for doc in sample)
+    if not ids:
+        return []
+    points = [ids[len(ids) * i // partitions] for i in range(1, partitions)]
+    return sorted(set(points))
+
+
+class PartitionCheckpoint:
+    """
+    Progress of one _id range of a parallel migration, saved as JSON (with Extended JSON
+    for the _ids) after every written batch so an interrupted run can resume from it.
+    "lower"/"upper" bound the range, "last_id" is the last _id written and "done" is
+    set once the range is finished. "version" and "full_scan" record the rules and the
+    query mode of the run, so a checkpoint is only resumed by the same kind of run.
+    """
+
+    def __init__(self, path, lower=None, upper=None, last_id=None, done=False,
+                 version=LOCATION_VERSION, full_scan=False):
+        self.path = path
+        self.lower = lower
+        self.upper = upper
+        self.last_id = last_id
+        self.done = done
+        self.version = version
+        self.full_scan = full_scan
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json_util.loads(f.read())
+        return cls(
+            path, data.get("lower"), data.get("upper"), data.get("last_id"), data.get("done", False),
+            data.get("version"), data.get("full_scan"),
+        )
+
+    def matches(self, full_scan: bool) -> bool:
+        """Whether this checkpoint was saved by a run with the current rules and query mode."""
+        return self.version == LOCATION_VERSION and self.full_scan == full_scan
+
+    def save(self):
+        if not self.path:
+            return
+        data = {
+            "version": self.version,
+            "full_scan": self.full_scan,
+            "lower": self.lower,
+            "upper": self.upper,
+            "last_id": self.last_id,
+            "done": self.done,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json_util.dumps(data))
+        os.replace(tmp_path, self.path)
+
+    def query(self, base_query):
+        id_range = {}
+        if self.last_id is not None:
+            id_range["$gt"] = self.last_id
+        elif self.lower is not None:
+            id_range["$gte"] = self.lower
+        if self.upper is not None:
+            id_range["$lt"] = self.upper
+        return {"$and": [base_query, {"_id": id_range}]} if id_range else base_query
+
+
+def plan_partitions(collection, query, workers: int, checkpoint_dir=None, resume: bool = False,
+                    full_scan: bool = False):
+    """
+    Split the migration into one _id range per worker, or reload the ranges of an
+    interrupted run from `checkpoint_dir` when `resume` is set. Checkpoints saved with
+    other location rules or another query mode (`full_scan`) are discarded instead.
+    """
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        saved = sorted(name for name in os.listdir(checkpoint_dir) if name.startswith("partition-") and name.endswith(".json"))
+        if resume and saved:
+            partitions = [PartitionCheckpoint.load(os.path.join(checkpoint_dir, name)) for name in saved]
+            if all(p.matches(full_scan) for p in partitions):
+                logger.info(
+                    "Resuming %d partitions from %s (%d already done)",
+                    len(partitions), checkpoint_dir, sum(p.done for p in partitions),
+                )
+                return partitions
+            logger.warning(
+                "Checkpoints in %s were saved by another kind of run (location version or --full-scan "
+                "differs), starting over", checkpoint_dir,
+            )
+        for name in saved:
+            os.remove(os.path.join(checkpoint_dir, name))
+
+    bounds = [None] + split_points(collection, query, workers) + [None]
+    partitions = []
+    for i, (lower, upper) in enumerate(zip(bounds, bounds[1:])):
+        path = os.path.join(checkpoint_dir, f"partition-{i:04d}.json") if checkpoint_dir else None
+        partition = PartitionCheckpoint(path, lower, upper, full_scan=full_scan)
+        partition.save()
+        partitions.append(partition)
+    return partitions
+
+
+def migrate_partition(collection, query, partition: PartitionCheckpoint, dry_run: bool, batch_size: int,
+                      table: LocationTable):
+    """Migrate one _id range with its own cursor, in _id order, checkpointing after each batch."""
+    if partition.done:
+        return 0, 0, 0
+    # A projection of its own per thread: mongomock rewrites the projection dict it is given.
+    cursor = collection.find(partition.query(query), dict(MIGRATION_FIELDS), batch_size=batch_size).sort("_id", 1)
+
+    def on_batch(last_id):
+        partition.last_id = last_id
+        partition.save()
+
+    counts = migrate_batches(collection, cursor, dry_run, batch_size, table, on_batch=None if dry_run else on_batch)
+    if not dry_run:
+        partition.done = True
+        partition.save()
+    return counts
+
+
+def migrate_parallel(collection, query, dry_run: bool, batch_size: int, table: LocationTable, workers: int,
+                     checkpoint_dir=None, resume: bool = False, full_scan: bool = False):
+    """
+    Migrate the documents matching `query` on `workers` threads, one _id range each.
+    `full_scan` tells which query mode `query` is, for the checkpoints.
+    Returns the summed (scanned, updated, skipped).
+    """
+    partitions = plan_partitions(
+        collection, query, workers, checkpoint_dir if not dry_run else None, resume, full_scan,
     )
+    logger.info("Migrating %d _id ranges on %d threads", len(partitions), workers)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="migrate") as executor:
+        results = list(executor.map(
+            lambda partition: migrate_partition(collection, query, partition, dry_run, batch_size, table),
+            partitions,
+        ))
+    if checkpoint_dir and not dry_run:
+        # Every range is done: the next run starts from a fresh plan.
+        for partition in partitions:
+            os.remove(partition.path)
+    return tuple(sum(counts) for counts in zip(*results)) if results else (0, 0, 0)
+
+
+def migrate_locations(
+    collection,
+    dry_run: bool = True,
+    full_scan: bool = False,
+    batch_size: int = 1000,
+    by_location: bool = False,
+    batched: bool = False,
+    location_table: LocationTable | None = None,
+    workers: int = 1,
+    checkpoint_dir: str | None = None,
+    resume: bool = False,
+):
+    started = time.perf_counter()
+    # Simple cases (no city nor department yet) can be settled per distinct location first;
+    # the document pass below then only sees what is left.
+    if by_location:
+        migrate_by_location(collection, dry_run=dry_run, batch_size=batch_size)
+
+    # Fast mode: only documents not normalized with the current rules yet.
+    # Full mode: process every document to enforce strict department normalization.
+    query = {} if full_scan else NOT_NORMALIZED
+
+    if workers > 1 or checkpoint_dir:
+        table = location_table if location_table is not None else LocationTable()
+        scanned, updated, skipped = migrate_parallel(
+            collection, query, dry_run, batch_size, table, max(1, workers), checkpoint_dir, resume, full_scan,
+        )
+        table.save()
+    else:
+        cursor = collection.find(query, MIGRATION_FIELDS, batch_size=batch_size)
+        if batched or location_table is not None:
+            table = location_table if location_table is not None else LocationTable()
+            scanned, updated, skipped = migrate_batches(collection, cursor, dry_run, batch_size, table)
+            table.save()
+        else:
+            scanned, updated, skipped = migrate_documents(collection, cursor, dry_run, batch_size)
+
+    METRICS.observe("migrate", time.perf_counter() - started)
+    METRICS.incr("migrate_scanned", scanned)
+    METRICS.incr("migrate_updated", updated)
+    METRICS.incr("migrate_skipped", skipped)
+    logger.info(
+        "Migration finished. scanned=%d, updated=%d, skipped=%d, dry_run=%s",
+        scanned, updated, skipped, dry_run,
+    )
+
+
+def explain_query(collection, full_scan: bool = False):
+    """Print the winning plan of the migration query, to check that it is served by an index."""
+    query = {} if full_scan else NOT_NORMALIZED
+    plan = collection.find(query).explain().get("queryPlanner", {}).get("winningPlan", {})
+    # Servers running the slot-based engine (MongoDB 7+) nest the stages under 'queryPlan'.
+    plan = plan.get("queryPlan", plan)
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?") + (f"({plan['indexName']})" if plan.get("indexName") else ""))
+        plan = plan.get("inputStage")
+    logger.info("Migration query plan: %s", ' <- '.join(stages) or 'unknown')
+    return stages
 
 
 def main():
@@ -336,40 +475,111 @@ def main():
         action="store_true",
         help="Process all documents (use once to normalize historical data)",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Number of updates sent per bulk write (default: 1000)",
+    )
+    parser.add_argument(
+        "--by-location",
+        action="store_true",
+        help="Fill documents missing both city and department with one update per distinct location first",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Print the query plan of the migration query and exit",
+    )
+    parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="Resolve each distinct location once per batch of --batch-size documents and update them together",
+    )
+    parser.add_argument(
+        "--location-table",
+        help="JSON file of resolved locations loaded before and saved after the run (implies --batched)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of threads migrating _id ranges of the collection in parallel (implies --batched, default: 1)",
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        help="Directory where each _id range saves its progress after every batch (implies --batched)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the interrupted run saved in --checkpoint-dir instead of starting over",
+    )
+    add_metrics_arguments(parser)
+    add_profiling_arguments(parser)
     args = parser.parse_args()
+    setup_logging(args.log_level)
 
+    with MEMORY.tracking(args.tracemalloc), profiled(args.profile):
+        run(args)
+
+
+def run(args):
+    # Kept across repeated runs, so locations resolved once are not resolved again.
+    location_table = LocationTable(args.location_table) if args.location_table else None
     if args.every_hour:
-        print(
-            f"Starting repeated mode. interval={args.interval_seconds}s, apply={args.apply}",
-            file=sys.stderr,
-        )
-        while True:
-            client = None
-            try:
-                client, collection = init_db()
-                migrate_locations(
-                    collection, dry_run=not args.apply, full_scan=args.full_scan
-                )
-            except KeyboardInterrupt:
-                print("Stopped by user", file=sys.stderr)
-                break
-            except Exception as e:
-                print(f"Run failed: {e}", file=sys.stderr)
-                traceback.print_exc(file=sys.stderr)
-            finally:
-                if client is not None:
-                    client.close()
-            try:
-                time.sleep(args.interval_seconds)
-            except KeyboardInterrupt:
-                print("Stopped by user", file=sys.stderr)
-                break
+        logger.info("Starting repeated mode. interval=%ss, apply=%s", args.interval_seconds, args.apply)
+        # One connection for the whole repeated mode instead of reconnecting every run.
+        client, collection = init_db()
+        ensure_indexes(collection)
+        try:
+            while True:
+                try:
+                    migrate_locations(
+                        collection,
+                        dry_run=not args.apply,
+                        full_scan=args.full_scan,
+                        batch_size=args.batch_size,
+                        by_location=args.by_location,
+                        batched=args.batched,
+                        location_table=location_table,
+                        workers=args.workers,
+                        checkpoint_dir=args.checkpoint_dir,
+                        resume=args.resume,
+                    )
+                    METRICS.write_report(args.metrics_json, args.metrics_prometheus)
+                except KeyboardInterrupt:
+                    logger.info("Stopped by user")
+                    break
+                except Exception as e:
+                    logger.exception("Run failed: %s", e)
+                try:
+                    time.sleep(args.interval_seconds)
+                except KeyboardInterrupt:
+                    logger.info("Stopped by user")
+                    break
+        finally:
+            client.close()
     else:
         client, collection = init_db()
         try:
+            ensure_indexes(collection)
+            if args.explain:
+                explain_query(collection, full_scan=args.full_scan)
+                return
             migrate_locations(
-                collection, dry_run=not args.apply, full_scan=args.full_scan
+                collection,
+                dry_run=not args.apply,
+                full_scan=args.full_scan,
+                batch_size=args.batch_size,
+                by_location=args.by_location,
+                batched=args.batched,
+                location_table=location_table,
+                workers=args.workers,
+                checkpoint_dir=args.checkpoint_dir,
+                resume=args.resume,
             )
+            METRICS.write_report(args.metrics_json, args.metrics_prometheus)
         finally:
             client.close()
 
@@ -1,14 +1,74 @@
 from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 import re
+from metrics import METRICS
 
-def clean_html(html_text):
-    """Remove HTML tags and extract clean text."""
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Collect the text nodes of an HTML fragment in a single pass, skipping the
+    contents of <script> and <style>. Mirrors BeautifulSoup's get_text(separator=' ').
+    """
+
+    SKIPPED_TAGS = {'script', 'style'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.chunks.append(data)
+
+    def unknown_decl(self, data):
+        # BeautifulSoup keeps CDATA sections as text.
+        if data.startswith('CDATA[') and not self._skip_depth:
+            self.chunks.append(data[len('CDATA['):])
+
+
+def clean_html_bs4(html_text):
+    """Remove HTML tags and extract clean text with BeautifulSoup (reference implementation)."""
     if not html_text:
-        return 'N/A'
-    
+        return None
+
     soup = BeautifulSoup(html_text, 'html.parser')
     for script in soup(["script", "style"]):
         script.decompose()
-    
+
     text = soup.get_text(separator=' ')
-    return re.sub(r'\s+', ' ', text).strip() or 'N/A'
+    return WHITESPACE_RE.sub(' ', text).strip() or None
+
+
+def clean_html(html_text, engine='stream'):
+    """
+    Remove HTML tags and extract clean text, or None when there is no text.
+    The default 'stream' engine tokenizes the markup without building a tree;
+    pass engine='bs4' to use the BeautifulSoup implementation instead.
+
+    Both engines agree on well-formed markup. On malformed character references the
+    stream engine follows the HTML5 rules of html.unescape while BeautifulSoup does
+    not: "&ampx" gives "&x" (bs4 keeps "&ampx"), "&unknown;" is kept as is (bs4 drops
+    the ';') and a bare "&" as in "R&D" is kept (bs4 4.11 drops it, giving "RD").
+    """
+    if not html_text:
+        return None
+    with METRICS.timer('clean_html'):
+        if engine == 'bs4':
+            return clean_html_bs4(html_text)
+
+        extractor = _TextExtractor()
+        extractor.feed(html_text)
+        extractor.close()
+        text = ' '.join(extractor.chunks)
+        return WHITESPACE_RE.sub(' ', text).strip() or None